@@ -0,0 +1,216 @@
+# Author: Carlos Natalino
+#
+# Benchmark of the model generation, solving and metric evaluation over the shipped topologies and the
+# synthetic ones of topology_generator, saved to a JSON file and compared against a stored baseline
+# usage: python benchmark.py [--sizes 100 200 1000 5000] [--solver highs] [--save-baseline]
+# runs offline with the open-source solvers, e.g., highs (SciPy) or lpsolve
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+import scipy
+
+import cdn_functions
+import cross_solver
+import reader
+import topology_generator
+
+shipped_topologies = ['Germany50', 'Coronet']
+
+# metrics ending with these are costs, compared with the threshold; the others are results, which must not change
+cost_metrics = ('_seconds', '_bytes', 'rows', 'columns', 'nonzeros', '_nodes')
+# differences below these are noise and never reported as regressions
+min_seconds = 0.05
+min_bytes = 2**20
+
+def timed(function, repeat=1):
+    # result of the last run and the best wall-clock time over the runs
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def peak_memory(function):
+    # peak of the memory allocated through Python (numpy arrays included) while running function
+    # measured in a separate run, since tracemalloc slows down the code
+    # memory allocated inside the solvers is not traced
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def benchmark_topologies(sizes, seed=1):
+    # shipped topologies plus the synthetic ones, generated once into ./topologies
+    topologies = [(name, f'./topologies/{name}.txt') for name in shipped_topologies]
+    for size in sizes:
+        name = f'synthetic-{size}-{seed}'
+        file = f'./topologies/{name}.txt'
+        if not os.path.exists(file):
+            print('generating', file)
+            reader.write_txt_file(topology_generator.generate_topology(size, seed=seed), file)
+        topologies.append((name, file))
+    return topologies
+
+def benchmark_model(name, write_model, options, solve):
+    # write_model(file) writes the model into a ModelFile
+    filename = f'./models/benchmark-{name}'
+    def write():
+        file = cross_solver.ModelFile(filename, name, mode=options.solver, stdout=os.devnull)
+        write_model(file)
+        return file
+    file, write_seconds = timed(write, options.repeat)
+    result = {'write_seconds': write_seconds, 'lp_bytes': os.path.getsize(filename + '.lp')}
+
+    def load():
+        model = cross_solver.SparseModel()
+        model.read_lp_file(filename + '.lp', comment_start=file.comment_start)
+        return model
+    model, result['parse_seconds'] = timed(load, options.repeat)
+    matrix = model.to_arrays()['matrix']
+    result.update(rows=matrix.shape[0], columns=matrix.shape[1], nonzeros=matrix.nnz)
+    if options.memory:
+        result['write_peak_bytes'] = peak_memory(write)
+
+    if solve:
+        variables, result['solve_seconds'] = timed(file.solve) # once, since solving dominates the running time
+        result['objective_value'] = None if variables is None else float(variables['objective_value'])
+        # phases and outcome as seen by the solver, see ModelFile.stats
+        for key in ['load_seconds', 'solve_seconds', 'extract_seconds', 'status', 'mip_gap', 'mip_nodes']:
+            value = file.stats[key]
+            result[f'solver_{key}'] = value if value is None or isinstance(value, str) else float(value)
+    return result
+
+def benchmark_topology(name, file, options):
+    results = {}
+    graph, seconds = timed(lambda: reader.read_file(file, name, cache=False), options.repeat)
+    num_nodes, num_links = graph.number_of_nodes(), graph.number_of_edges()
+    results[f'{name}/read'] = {'read_seconds': seconds, 'nodes': num_nodes, 'links': num_links}
+    print(name, num_nodes, 'nodes', num_links, 'links')
+
+    # replicas placed by the RPP heuristic, or every 12th node for the topologies too large for the models
+    budget = max(2, num_nodes // 12)
+    placement = None
+    if num_nodes <= options.max_model_nodes:
+        placement, seconds = timed(lambda: cdn_functions.rpp_heuristic(graph, budget), options.repeat)
+        results[f'{name}/rpp-heuristic'] = {'heuristic_seconds': seconds, 'objective_value': placement['objective_value']}
+        graph.graph['dcs'] = [node for node in graph.nodes() if placement[f'r_{node}'] == 1]
+
+        solve = num_nodes <= options.max_solve_nodes
+        for formulation in ['flow', 'pmedian']:
+            results[f'{name}/rpp-{formulation}'] = benchmark_model(f'rpp-{formulation}-{name}',
+                                                                   lambda file: cdn_functions.write_rpp(file, graph, budget, formulation=formulation),
+                                                                   options, solve)
+        results[f'{name}/clsd'] = benchmark_model(f'clsd-{name}', lambda file: cdn_functions.write_clsd(file, graph, placement, options.p),
+                                                  options, solve)
+    else:
+        graph.graph['dcs'] = list(graph.nodes())[::12]
+
+    # metrics: A2TR and ACA curves of a random attack, a single state after cutting 10% of the links,
+    # and a batch of random failure states
+    order = cdn_functions.attack_order(graph, 'random', seed=options.seed)
+    (a2tr_curve, aca_curve), sweep_seconds = timed(lambda: cdn_functions.attack_curves(graph, order), options.repeat)
+    result = {'sweep_seconds': sweep_seconds, 'mu_a2tr': float(np.mean(a2tr_curve)), 'mu_aca': float(np.mean(aca_curve))}
+    cur_graph = graph.copy()
+    cur_graph.remove_edges_from(order[:num_links // 10])
+    result['a2tr'], result['a2tr_seconds'] = timed(lambda: cdn_functions.a2tr(cur_graph, graph), options.repeat)
+    result['aca'], result['aca_seconds'] = timed(lambda: cdn_functions.aca(cur_graph, graph), options.repeat)
+    masks = np.random.default_rng(options.seed).random((options.states, num_links)) >= options.failure_probability
+    (a2tr_values, aca_values), result['batch_seconds'] = timed(lambda: cdn_functions.a2tr_aca_batch(graph, masks), options.repeat)
+    result.update(batch_a2tr=float(a2tr_values.mean()), batch_aca=float(aca_values.mean()))
+    if options.memory:
+        result['sweep_peak_bytes'] = peak_memory(lambda: cdn_functions.attack_curves(graph, order))
+        result['batch_peak_bytes'] = peak_memory(lambda: cdn_functions.a2tr_aca_batch(graph, masks))
+    results[f'{name}/metrics'] = result
+    return results
+
+def environment(options):
+    return {'date': str(datetime.datetime.now(datetime.timezone.utc)), 'host': platform.node(), 'platform': platform.platform(),
+            'cpus': os.cpu_count(), 'python': platform.python_version(), 'numpy': np.__version__, 'scipy': scipy.__version__,
+            'networkx': nx.__version__, 'solver': options.solver, 'solver_version': str(cross_solver.solver_version(options.solver)),
+            'options': {key: value for key, value in vars(options).items() if key not in ['output', 'baseline', 'save_baseline']}}
+
+def compare(results, baseline, threshold, tolerance=1e-6):
+    # prints every metric next to its baseline value and returns the number of regressions and changed results
+    failures = 0
+    print(f'{"case":40} {"metric":20} {"baseline":>14} {"current":>14} {"ratio":>7}')
+    for case, metrics in baseline['results'].items():
+        if case not in results:
+            print(f'{case:40} not benchmarked in this run')
+            continue
+        for metric, old in metrics.items():
+            new = results[case].get(metric)
+            if new is None or old is None:
+                continue
+            if isinstance(old, str) or isinstance(new, str):
+                status = '' if new == old else 'CHANGED'
+                if status:
+                    print(f'{case:40} {metric:20} {old} -> {new} {status}')
+                failures += status == 'CHANGED'
+                continue
+            if metric.endswith(cost_metrics):
+                floor = min_seconds if metric.endswith('_seconds') else min_bytes if metric.endswith('_bytes') else 0
+                if new > old * threshold and new - old > floor:
+                    status = 'REGRESSION'
+                elif new * threshold < old and old - new > floor:
+                    status = 'improved'
+                else:
+                    status = ''
+            else:
+                status = '' if np.isclose(new, old, rtol=tolerance, atol=tolerance) else 'CHANGED'
+            failures += status in ['REGRESSION', 'CHANGED']
+            ratio = f'{new / old:7.2f}' if old != 0 else ' ' * 7
+            print(f'{case:40} {metric:20} {old:14.6g} {new:14.6g} {ratio} {status}')
+    return failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks model generation, solving and metric evaluation')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100, 200, 1000, 5000], help='number of nodes of the synthetic topologies')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--solver', default=cross_solver.mode, choices=list(cross_solver.solver_modules))
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each measurement but the solving, the best time is kept')
+    parser.add_argument('--p', type=int, default=2, help='number of links cut in the CLSD model')
+    parser.add_argument('--states', type=int, default=1000, help='random failure states evaluated in a batch')
+    parser.add_argument('--failure-probability', type=float, default=0.05, help='of each link in the random failure states')
+    parser.add_argument('--max-model-nodes', type=int, default=200, help='largest topology for which the RPP and CLSD models are written')
+    parser.add_argument('--max-solve-nodes', type=int, default=100, help='largest topology for which the models are solved')
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help='skips the runs measuring the peak memory')
+    parser.add_argument('--output', default='./results/benchmark.json')
+    parser.add_argument('--baseline', default='./results/benchmark-baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='stores the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=1.25, help='ratio to the baseline above which a cost is a regression')
+    options = parser.parse_args()
+
+    os.makedirs('./models', exist_ok=True)
+    results = {}
+    for name, file in benchmark_topologies(options.sizes, seed=options.seed):
+        results.update(benchmark_topology(name, file, options))
+    report = {'environment': environment(options), 'results': results}
+
+    for path in [options.output] + ([options.baseline] if options.save_baseline else []):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print('results written to', path)
+
+    if not options.save_baseline:
+        if not os.path.exists(options.baseline):
+            print('no baseline found at', options.baseline, '- run with --save-baseline to store one')
+        else:
+            with open(options.baseline) as f:
+                baseline = json.load(f)
+            if baseline['environment']['host'] != report['environment']['host']:
+                print('warning: the baseline was measured on', baseline['environment']['host'])
+            failures = compare(results, baseline, options.threshold)
+            print(failures, 'regressions or changed results')
+            sys.exit(1 if failures > 0 else 0)
@@ -1,177 +1,936 @@
 import os
 import sys
 import datetime
+import multiprocessing
+from collections.abc import Mapping
+from operator import itemgetter
 import numpy as np
-import networkx as nx
+import networkx.algorithms.centrality as nxcentrality
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components, shortest_path
 
-from cross_solver import ModelFile, mode
+from cross_solver import ModelFile, MemoryModelFile
+from reader import graph_index
         
 
-def rpp_min_d(graph, budget):
-    file = ModelFile('./models/rpp-{}_{}'.format(graph.graph['name'], budget), 'rpp-{}_{}'.format(graph.graph['name'], budget), mode=mode) # open with 'w' flag to write over existing file
+def _model_file(name, in_memory=False):
+    # model written to ./models/{name}.lp (over an existing file), or kept in memory without writing the .lp file
+    return (MemoryModelFile if in_memory else ModelFile)(f'./models/{name}', name)
 
+def rpp_min_d(graph, budget, in_memory=False, formulation='flow', mip_start=None):
+    # formulation 'flow' routes every node to its replica with the z_s_i_j variables, while 'pmedian'
+    # uses the shortest-path distances between nodes and only has the r_q and y_q_s variables
+    # mip_start can be a solution of rpp_heuristic, given to the solver as the initial incumbent
+    file = _model_file('rpp-{}_{}'.format(graph.graph['name'], budget), in_memory)
+    write_rpp(file, graph, budget, formulation=formulation)
+    variables_rpp = file.solve(mip_start=mip_start)
+
+    print('done')
+    print('found', len(variables_rpp), 'variables in the solution')
+    return variables_rpp
+
+def write_rpp(file, graph, budget, formulation='flow'):
     file.comment(f'writing an RPP model ')
     file.comment(f'Now: {datetime.datetime.now().astimezone()} ')
     
     file.comment('objective function')
     file.minimize('sum_distance')
 
-    file.comment('sum distances')
-    file.write('sum_distance', end=False)
-    for s in graph.nodes():
-        for (i, j) in graph.edges(): # for set A, we need to to i->j and j->i
-            file.write(' - {weight} z_{s}_{i}_{j}'.format(weight=graph[i][j]['weight'], s=s, i=i, j=j), end=False)
-            file.write(' - {weight} z_{s}_{j}_{i}'.format(weight=graph[i][j]['weight'], s=s, i=i, j=j), end=False)
-    file.write(' = 0')
-    
-    file.comment('limiting the number of replicas')
-    first = True
-    for q in graph.nodes():
-        if not first:
-            file.write(' + ', end=False)
-        else:
-            first = False
-        file.write('r_{q}'.format(q=q), end=False)
-    file.write(' = {R}'.format(R=budget))
-    
-    file.comment('only one DC is the source for every node')
-    for s in graph.nodes():
-        first = True
-        for q in graph.nodes():
-            if not first:
-                file.write(' + ', end=False)
-            else:
-                first = False
-            file.write('y_{q}_{s}'.format(q=q, s=s), end=False)
-        file.write(' = 1')
-        
-    for s in graph.nodes():
-        for q in graph.nodes():
-            file.write('y_{q}_{s} - r_{q} <= 0'.format(q=q, s=s))
-            
-    for s in graph.nodes():
-        for i in graph.nodes():
-            t_i_s = 1 if s == i else 0
-            file.write('y_{i}_{s}'.format(i=i, s=s), end=False)
-            for j in graph.neighbors(i):
-                file.write(' + z_{s}_{i}_{j} - z_{s}_{j}_{i}'.format(s=s, i=i, j=j), end=False)
-            file.write(' = {t}'.format(t=t_i_s))
+    model = rpp_matrix(graph, budget, formulation=formulation)
+    names = rpp_column_names(graph, formulation=formulation)
+    file.comment(f'{formulation} formulation: sum distances, limiting the number of replicas, only one DC is the source for every node, y <= r'
+                 + (' and flow conservation' if formulation == 'flow' else ''))
+    file.write_matrix(names, model['matrix'], model['senses'], model['rhs'])
     file.comment('defining the bounds')
     file.bounds()
-    binary_variables = ''
-    for q in graph.nodes():
-        binary_variables += ' r_{q}'.format(q=q)
-        for s in graph.nodes():
-            binary_variables += ' y_{q}_{s}'.format(q=q, s=s)
-        for (i, j) in graph.edges():
-            binary_variables += ' z_{s}_{i}_{j}'.format(s=q, i=i, j=j)
-            binary_variables += ' z_{s}_{j}_{i}'.format(s=q, i=i, j=j)
-    file.binary_variables(binary_variables)
+    file.binary_variables(names[1:]) # all but sum_distance
     file.close()
-    
-    variables_rpp = file.solve()
 
-    print('done')
-    print('found', len(variables_rpp), 'variables in the solution')
-    return variables_rpp
+def rpp_heuristic(graph, budget, distances=None):
+    # greedy addition of replicas followed by vertex substitution (Teitz-Bart swaps) over the
+    # shortest-path distances. pass distances=distance_matrix(graph) when solving several budgets
+    # returns the variables in the format of rpp_min_d, plus lower_bound and gap
+    if distances is None:
+        distances = distance_matrix(graph)
+    num_nodes = graph.number_of_nodes()
+    if not 1 <= budget <= num_nodes:
+        raise ValueError(f'the budget must be between 1 and {num_nodes}')
+
+    replicas = []
+    nearest = np.full(num_nodes, np.inf)
+    for _ in range(budget):
+        costs = np.minimum(nearest[None, :], distances).sum(axis=1)
+        costs[replicas] = np.inf
+        replicas.append(int(np.argmin(costs)))
+        nearest = np.minimum(nearest, distances[replicas[-1]])
+
+    improved = True
+    while improved:
+        improved = False
+        # distance to the closest and second closest replicas, and the position of the closest in replicas
+        order = np.argsort(distances[replicas], axis=0)
+        closest = order[0]
+        best = distances[replicas][closest, np.arange(num_nodes)]
+        second = distances[replicas][order[1], np.arange(num_nodes)] if budget > 1 else np.full(num_nodes, np.inf)
+        cost = best.sum()
+        for candidate in range(num_nodes):
+            if candidate in replicas:
+                continue
+            with_candidate = np.minimum(distances[candidate], best)
+            # removing the replica at position f moves the nodes it serves to the second closest or to the candidate
+            removal = np.bincount(closest, weights=np.minimum(distances[candidate], second) - with_candidate, minlength=budget)
+            position = int(np.argmin(removal))
+            if with_candidate.sum() + removal[position] < cost - 1e-9:
+                replicas[position] = candidate
+                improved = True
+                break
+
+    source = np.array(replicas)[np.argmin(distances[replicas], axis=0)]
+    values = np.zeros(1 + num_nodes + num_nodes ** 2, dtype=int)
+    values[1 + np.array(replicas)] = 1
+    values[1 + num_nodes + source * num_nodes + np.arange(num_nodes)] = 1
+    variables = dict(zip(rpp_column_names(graph, formulation='pmedian'), values.tolist()))
+    sum_distance = float(distances[source, np.arange(num_nodes)].sum())
+    variables['sum_distance'] = sum_distance
+    variables['objective_value'] = sum_distance
+
+    # every node that is not a replica is at least as far as its closest neighbor
+    neighbor = distances + np.diag(np.full(num_nodes, np.inf))
+    variables['lower_bound'] = float(np.sort(neighbor.min(axis=0))[:num_nodes - budget].sum())
+    variables['gap'] = (sum_distance - variables['lower_bound']) / sum_distance if sum_distance > 0 else 0.
+    return variables
+
+def distance_matrix(graph):
+    # shortest-path distances (link weights) between all nodes, following the order of graph.nodes()
+    return shortest_path(graph_index(graph)['adjacency'], method='D', directed=False)
+
+def rpp_matrix(graph, budget, formulation='flow'):
+    # constraint matrix of the RPP built from index arrays. the columns are sum_distance, r_q,
+    # y_q_s (position q * N + s) and z_s_i_j (position s * 2E + a, where the arcs a are the links
+    # i->j of graph.edges() followed by the links j->i), see rpp_column_names
+    # the rows are (sum distances), (number of replicas), (single source) for every s,
+    # (y <= r) for every s and q, and (flow conservation) for every s and i
+    # with formulation 'pmedian' there are no z variables nor flow conservation, and
+    # the sum of distances uses the shortest-path distance between q and s for y_q_s
+    if formulation == 'pmedian':
+        return _pmedian_matrix(graph, budget)
+    if formulation != 'flow':
+        raise ValueError(f'unknown RPP formulation {formulation}')
+    index, src, dst = _edge_arrays(graph)
+    weight = graph_index(graph)['weight']
+    num_nodes, num_edges = len(index), len(src)
+    num_arcs = 2 * num_edges
+    r0, y0, z0 = 1, 1 + num_nodes, 1 + num_nodes + num_nodes ** 2
+    source0, link0 = 2, 2 + num_nodes
+    flow0 = link0 + num_nodes ** 2
+    arc_from = np.concatenate([src, dst])
+    arc_to = np.concatenate([dst, src])
+
+    q, s = np.divmod(np.arange(num_nodes ** 2), num_nodes) # every (q, s), also read as (s, i) below
+    y = y0 + q * num_nodes + s
+    s_arc, arc = np.divmod(np.arange(num_nodes * num_arcs), num_arcs) # every (s, arc)
+    z = z0 + s_arc * num_arcs + arc
+    ones = np.ones(num_nodes ** 2)
+    rows = [np.zeros(1 + len(z), dtype=np.int64), np.ones(num_nodes, dtype=np.int64),
+            source0 + s,
+            link0 + s * num_nodes + q, link0 + s * num_nodes + q,
+            flow0 + q * num_nodes + s, flow0 + s_arc * num_nodes + arc_from[arc], flow0 + s_arc * num_nodes + arc_to[arc]]
+    columns = [np.concatenate([[0], z]), r0 + np.arange(num_nodes),
+               y,
+               y, r0 + q,
+               y0 + s * num_nodes + q, z, z]
+    values = [np.concatenate([[1.], -np.tile(np.concatenate([weight, weight]), num_nodes)]), np.ones(num_nodes),
+              ones,
+              ones, -ones,
+              ones, np.ones(len(z)), -np.ones(len(z))]
+    num_rows = flow0 + num_nodes ** 2
+    matrix = sparse.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                               shape=(num_rows, z0 + num_nodes * num_arcs))
+    matrix.has_canonical_format = True # every (row, column) appears once, no need to sum duplicates
+    matrix = matrix.tocsr()
+    senses = np.full(num_rows, 'E')
+    senses[link0:flow0] = 'L'
+    rhs = np.zeros(num_rows)
+    rhs[1] = budget
+    rhs[source0:link0] = 1
+    rhs[flow0 + np.arange(num_nodes) * (num_nodes + 1)] = 1 # s == i
+    return {'matrix': matrix, 'senses': senses, 'rhs': rhs}
+
+def _pmedian_matrix(graph, budget):
+    distances = distance_matrix(graph)
+    if np.any(np.isinf(distances)):
+        raise ValueError('the pmedian formulation requires a connected graph')
+    num_nodes = graph.number_of_nodes()
+    r0, y0 = 1, 1 + num_nodes
+    source0, link0 = 2, 2 + num_nodes
+    num_rows = link0 + num_nodes ** 2
+
+    q, s = np.divmod(np.arange(num_nodes ** 2), num_nodes)
+    y = y0 + q * num_nodes + s
+    ones = np.ones(num_nodes ** 2)
+    rows = [np.zeros(1 + len(y), dtype=np.int64), np.ones(num_nodes, dtype=np.int64), source0 + s, link0 + s * num_nodes + q, link0 + s * num_nodes + q]
+    columns = [np.concatenate([[0], y]), r0 + np.arange(num_nodes), y, y, r0 + q]
+    values = [np.concatenate([[1.], -distances[q, s]]), np.ones(num_nodes), ones, ones, -ones]
+    matrix = sparse.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))), shape=(num_rows, y0 + num_nodes ** 2))
+    matrix.has_canonical_format = True # every (row, column) appears once, no need to sum duplicates
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros() # the distance of y_q_q to itself, which would be written as -0.0
+    senses = np.full(num_rows, 'E')
+    senses[link0:] = 'L'
+    rhs = np.zeros(num_rows)
+    rhs[1] = budget
+    rhs[source0:link0] = 1
+    return {'matrix': matrix, 'senses': senses, 'rhs': rhs}
+
+def rpp_column_names(graph, formulation='flow'):
+    nodes = list(graph.nodes())
+    names = ['sum_distance']
+    names.extend(f'r_{q}' for q in nodes)
+    names.extend(f'y_{q}_{s}' for q in nodes for s in nodes)
+    if formulation == 'flow':
+        arcs = [f'{i}_{j}' for i, j in graph.edges()] + [f'{j}_{i}' for i, j in graph.edges()]
+        names.extend(f'z_{s}_{arc}' for s in nodes for arc in arcs)
+    return names
+
+def clsd(graph, variables_rpp, p, in_memory=False, heuristic=False, lazy=False):
+    # variables_rpp is the solution of the RPP, as a dict or a Solution
+    # heuristic=True starts the solver from the attack found by clsd_heuristic, also used as cutoff
+    # lazy=True starts without the rows of (13) and solves again adding rows of (13) until every node
+    # that (12) and (13) force to be connected to a replica after the attack has v_i = 1. the optimal
+    # objective is then the same as with all rows, since u can be set to the values forced by (12) and
+    # (13) without changing v. for each node that is missing, the rows added are those deriving its u = 1
+    topology = graph.graph['name']
+    solve_options = {}
+    if heuristic:
+        start = clsd_heuristic(graph, variables_rpp, p)
+        print('heuristic attack with sum_connected', start['sum_connected'])
+        solve_options = {'mip_start': start, 'cutoff': start['sum_connected'] + 0.5}
 
-def clsd(graph, variables_rpp, p):
+    if not lazy:
+        file = _model_file(f'clsd-{topology}_{p}', in_memory)
+        write_clsd(file, graph, variables_rpp, p)
+        variables_clsd = file.solve(**solve_options)
+    else:
+        positions = _transitivity_positions(graph)
+        nodes = np.array(graph_index(graph)['nodes'], dtype=object)
+        triples = list(zip(nodes[positions[0]], nodes[positions[1]], nodes[positions[2]]))
+        replica_flags = _replica_flags(graph, variables_rpp)
+        replicas = np.flatnonzero(replica_flags)
+        pairs = set()
+        iteration = 0
+        while True:
+            iteration += 1
+            file = _model_file(f'clsd-{topology}_{p}', in_memory)
+            write_clsd(file, graph, variables_rpp, p, transitivity=[(i, j, k) for i, j, k in triples if (i, j) in pairs])
+            variables_clsd = file.solve(**solve_options)
+            if variables_clsd is None:
+                break
+            cut_graph = graph.copy()
+            cut_graph.remove_edges_from([(i, j) for i, j in graph.edges() if variables_clsd[f'x_{i}_{j}'] == 1])
+            index, labels = _component_labels(cut_graph)
+            # nodes with v_i = 0 that share a component with a replica, the only ones that (13) can force to 1
+            missing = [index[i] for i in graph.nodes() if not replica_flags[index[i]] and variables_clsd[f'v_{i}'] == 0]
+            missing = [i for i in missing if np.any(labels[replicas] == labels[i])]
+            through = _transitivity_closure(cut_graph, positions, np.unique(labels[missing]))
+            new_pairs = set()
+            for i in missing:
+                for replica in replicas[labels[replicas] == labels[i]]:
+                    new_pairs |= _transitivity_derivation(through, nodes, i, replica) - pairs
+            print(f'iteration {iteration}: adding the (13) rows of {len(new_pairs)} pairs')
+            if len(new_pairs) == 0:
+                break
+            pairs |= new_pairs
+
+    print('done for p', p)
+    print('found', len(variables_clsd), 'variables in the solution')
+    return variables_clsd
+
+def clsd_sweep(graph, variables_rpp, pmin, pmax, in_memory=False):
+    # solves the CLSD for every p in pmin..pmax with a single model, changing only the
+    # right-hand side of (11) and starting each solve from the attack found for the previous p
     topology = graph.graph['name']
-    file = ModelFile(f'./models/clsd-{topology}_{p}', f'clsd-{topology}_{p}', mode=mode) # open with 'w' flag to write over existing file
+    file = _model_file(f'clsd-{topology}_{pmin}-{pmax}', in_memory)
+    write_clsd(file, graph, variables_rpp, pmin)
+    links = [f'x_{i}_{j}' for i, j in graph.edges()]
+
+    def next_attack(previous, p):
+        # links cut for the previous p, plus (or minus) the first links in graph.edges() to reach p
+        cut = [x for x in links if previous[x] == 1]
+        cut = set(cut[:p] + [x for x in links if previous[x] == 0][:max(0, p - len(cut))])
+        return {x: 1 if x in cut else 0 for x in links}
+
+    solutions_clsd = file.solve_rhs_sweep('budget', range(pmin, pmax + 1), mip_start=next_attack)
+
+    print('done for p', pmin, 'to', pmax)
+    return solutions_clsd
+
+def _grown_regions(neighbors, is_replica, seeds, budget):
+    # regions of non-replica nodes that can be separated by cutting at most `budget` links, found by
+    # growing each seed with the neighbor that adds the fewest links to the boundary of the region
+    # neighbors[i] lists the neighbors of i through links that are up (repeated for parallel links)
+    # returns a dict from each region to the number of links in its boundary
+    regions = {}
+    for seed in seeds:
+        region = {seed}
+        boundary = len(neighbors[seed])
+        links = {} # number of links between the region and each node around it
+        for k in neighbors[seed]:
+            links[k] = links.get(k, 0) + 1
+        while True:
+            if boundary <= budget:
+                regions.setdefault(frozenset(region), boundary)
+            frontier = [k for k in links if not is_replica[k]]
+            if len(frontier) == 0 or boundary > 2 * budget: # the boundary rarely shrinks back from this far
+                break
+            k = min(frontier, key=lambda k: len(neighbors[k]) - 2 * links[k])
+            boundary += len(neighbors[k]) - 2 * links.pop(k)
+            region.add(k)
+            for l in neighbors[k]:
+                if l not in region:
+                    links[l] = links.get(l, 0) + 1
+    return regions
+
+def clsd_heuristic(graph, variables_rpp, p, max_passes=100):
+    # attack of p links that disconnects as many nodes as possible from the replicas, without a solver
+    # greedily cuts the boundary of regions of nodes that fit the remaining budget, picking either the
+    # region with most nodes per cut link or the largest region, then swaps cut and uncut links while
+    # it improves. the best of both rules is kept
+    # returns the variables in the format of clsd, which is a feasible solution of the CLSD model
+    index, src, dst = _edge_arrays(graph)
+    nodes = list(graph.nodes())
+    edges = list(graph.edges())
+    if not 0 <= p <= len(edges):
+        raise ValueError(f'p must be between 0 and {len(edges)}')
+    is_replica = _replica_flags(graph, variables_rpp)
+
+    def connected(masks): # sum_connected of each state, labeling about a million nodes at a time
+        values = []
+        for chunk in range(0, len(masks), max(1, 2**20 // len(nodes))):
+            batch = masks[chunk:chunk + max(1, 2**20 // len(nodes))]
+            labels = _batch_labels(len(nodes), src, dst, batch)
+            num_replicas = np.bincount(labels, weights=np.tile(is_replica, len(batch)))
+            values.append(((num_replicas[labels] > 0).reshape(len(batch), len(nodes)) & ~is_replica).sum(axis=1))
+        return np.concatenate(values)
+
+    rules = {'ratio': lambda region: (len(region[0]) / region[1], len(region[0])),
+             'size': lambda region: (len(region[0]), -region[1])}
+    best_up, best_value = None, None
+    for rule in rules.values():
+        up = np.ones(len(edges), dtype=bool)
+        while p - np.count_nonzero(~up) > 0:
+            neighbors = [[] for _ in nodes]
+            for e in np.flatnonzero(up):
+                neighbors[src[e]].append(dst[e])
+                neighbors[dst[e]].append(src[e])
+            labels = _batch_labels(len(nodes), src, dst, up[None, :])
+            num_replicas = np.bincount(labels, weights=is_replica)
+            seeds = [i for i in range(len(nodes)) if not is_replica[i] and num_replicas[labels[i]] > 0]
+            regions = _grown_regions(neighbors, is_replica, seeds, p - np.count_nonzero(~up))
+            if len(regions) == 0:
+                break
+            region, _ = max(regions.items(), key=rule)
+            in_region = np.zeros(len(nodes), dtype=bool)
+            in_region[list(region)] = True
+            up &= in_region[src] == in_region[dst]
+
+        # the remaining budget goes to the links whose removal helps the most, one at a time
+        while np.count_nonzero(~up) < p:
+            candidates = np.flatnonzero(up)
+            masks = np.repeat(up[None, :], len(candidates), axis=0)
+            masks[np.arange(len(candidates)), candidates] = False
+            up = masks[np.argmin(connected(masks))]
 
+        # local search swapping one cut link with one link that is up
+        value = connected(up[None, :])[0]
+        for _ in range(max_passes):
+            best_swap, best_swap_value = None, value
+            candidates = np.flatnonzero(up)
+            for restored in np.flatnonzero(~up):
+                masks = np.repeat(up[None, :], len(candidates), axis=0)
+                masks[:, restored] = True
+                masks[np.arange(len(candidates)), candidates] = False
+                values = connected(masks)
+                if len(values) > 0 and values.min() < best_swap_value:
+                    best_swap, best_swap_value = masks[np.argmin(values)], values.min()
+            if best_swap is None:
+                break
+            up, value = best_swap, best_swap_value
+        if best_value is None or value < best_value:
+            best_up, best_value = up, value
+
+    labels = _batch_labels(len(nodes), src, dst, best_up[None, :])
+    num_replicas = np.bincount(labels, weights=is_replica)
+    variables = {f'x_{i}_{j}': int(not best_up[e]) for e, (i, j) in enumerate(edges)}
+    for i in nodes:
+        if not is_replica[index[i]]:
+            variables[f'v_{i}'] = int(num_replicas[labels[index[i]]] > 0)
+    ids = graph_index(graph)['ids']
+    first, second = np.nonzero(ids[:, None] < ids[None, :])
+    same = (labels[first] == labels[second]).astype(int).tolist()
+    variables.update((f'u_{nodes[i]}_{nodes[j]}', value) for i, j, value in zip(first, second, same))
+    for i, j in edges: # names of (12) in the order of the link
+        variables[f'u_{i}_{j}'] = int(labels[index[i]] == labels[index[j]])
+    variables['sum_connected'] = int(best_value)
+    variables['objective_value'] = float(best_value)
+    return variables
+
+def _ordered_pair(i, j):
+    return (i, j) if int(i) < int(j) else (j, i)
+
+def _transitivity_closure(cut_graph, triples, components):
+    # for each pair of nodes (positions in graph.nodes()), the position of the node k of the row of (13) that
+    # forces u_i_j = 1 when only the links of cut_graph are up, -1 for the links that are up and -2 otherwise
+    # triples are the positions of _transitivity_positions. forced pairs are always in the same component of
+    # cut_graph, so only the triples inside the components given (labels of _component_labels) are walked.
+    # not every pair of a component is forced: (13) has no rows for adjacent nodes, so the u of a cut link
+    # stays free even if its nodes are still connected through other links
+    index, labels = _component_labels(cut_graph)
+    _, src, dst = _edge_arrays(cut_graph)
+    first, second, third = triples
+    inside = (labels[first] == labels[second]) & np.isin(labels[first], components)
+    first, second, third = first[inside], second[inside], third[inside]
+    through = np.full((len(index), len(index)), -2, dtype=np.int32)
+    through[src, dst] = through[dst, src] = -1
+    while True:
+        new = np.flatnonzero((through[first, second] == -2) & (through[first, third] != -2) & (through[second, third] != -2))
+        if len(new) == 0:
+            return through
+        _, rows = np.unique(first[new] * len(index) + second[new], return_index=True) # one row of (13) per pair
+        new = new[rows]
+        through[first[new], second[new]] = through[second[new], first[new]] = third[new]
+
+def _transitivity_derivation(through, nodes, i, j):
+    # pairs of (13) whose rows are needed to force u = 1 for the nodes at positions i and j, following the closure
+    pairs = set()
+    pending = [(i, j)]
+    while len(pending) > 0:
+        i, j = pending.pop()
+        k = through[i, j]
+        pair = _ordered_pair(nodes[i], nodes[j])
+        if k < 0 or pair in pairs:
+            continue
+        pairs.add(pair)
+        pending.append((i, k))
+        pending.append((j, k))
+    return pairs
+
+def clsd_transitivity(graph):
+    # the triples (i, j, k) of constraint (13): i < j are not adjacent and k is a neighbor of the one with the lowest degree
+    nodes = np.array(graph_index(graph)['nodes'], dtype=object)
+    first, second, third = _transitivity_positions(graph)
+    return list(zip(nodes[first], nodes[second], nodes[third]))
+
+def _transitivity_positions(graph):
+    # positions in graph.nodes() of the triples of clsd_transitivity, as three arrays
+    index = graph_index(graph)
+    ids, indptr, indices = index['ids'], index['indptr'], index['indices']
+    num_nodes = len(ids)
+    adjacent = np.zeros((num_nodes, num_nodes), dtype=bool)
+    adjacent[index['src'], index['dst']] = adjacent[index['dst'], index['src']] = True
+    first, second = np.nonzero((ids[:, None] < ids[None, :]) & ~adjacent) # in the order of the nested loops over the nodes
+    degree = np.diff(indptr)
+    lowest = np.where(degree[first] <= degree[second], first, second)
+    counts = degree[lowest]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    neighbors = indices[np.repeat(indptr[lowest], counts) + offsets]
+    return np.repeat(first, counts), np.repeat(second, counts), neighbors
+
+def clsd_matrix(graph, variables_rpp, transitivity=None):
+    # rows (12) to (15) of the CLSD built from index arrays, with transitivity as in write_clsd. the columns
+    # are u_i_j for the pairs i < j (in the order of np.nonzero), x_i_j in the order of graph.edges() and
+    # v_i for the nodes that are not replicas, see clsd_column_names
+    # the rows are (12) for every link, (13) for every triple and (14)-(15) for every pair with one replica
+    index = graph_index(graph)
+    ids, src, dst = index['ids'], index['src'], index['dst']
+    num_nodes, num_edges = len(ids), len(src)
+    replica_flags = _replica_flags(graph, variables_rpp)
+    first, second = np.nonzero(ids[:, None] < ids[None, :])
+    u = np.zeros((num_nodes, num_nodes), dtype=np.int64) # column of the pair, in both orders
+    u[first, second] = u[second, first] = np.arange(len(first))
+    x0 = len(first)
+    v = np.zeros(num_nodes, dtype=np.int64)
+    v[~replica_flags] = x0 + num_edges + np.arange(np.count_nonzero(~replica_flags))
+    if transitivity is None:
+        i, j, k = _transitivity_positions(graph)
+    else:
+        node_index = index['node_index']
+        i, j, k = np.array([[node_index[node] for node in triple] for triple in transitivity], dtype=np.int64).reshape(-1, 3).T
+    one = replica_flags[first] != replica_flags[second]
+    pair_first, pair_second = first[one], second[one]
+    not_replica = np.where(replica_flags[pair_first], pair_second, pair_first)
+
+    links, triples, pairs = np.arange(num_edges), num_edges + np.arange(len(i)), num_edges + len(i) + np.arange(len(pair_first))
+    rows = [links, links, triples, triples, triples, pairs, pairs]
+    columns = [u[src, dst], x0 + links, u[i, k], u[j, k], u[i, j], u[pair_first, pair_second], v[not_replica]]
+    values = [np.ones(len(links)), np.ones(len(links)), np.ones(len(i)), np.ones(len(i)), -np.ones(len(i)),
+              np.ones(len(pair_first)), -np.ones(len(pair_first))]
+    num_rows = num_edges + len(i) + len(pair_first)
+    matrix = sparse.coo_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(columns))),
+                               shape=(num_rows, x0 + num_edges + np.count_nonzero(~replica_flags))).tocsr()
+    senses = np.full(num_rows, 'L')
+    senses[:num_edges] = 'G'
+    rhs = np.zeros(num_rows)
+    rhs[:num_edges + len(i)] = 1
+    return {'matrix': matrix, 'senses': senses, 'rhs': rhs}
+
+def clsd_column_names(graph, variables_rpp):
+    index = graph_index(graph)
+    nodes, ids = index['nodes'], index['ids']
+    names = [f'u_{nodes[i]}_{nodes[j]}' for i, j in zip(*np.nonzero(ids[:, None] < ids[None, :]))]
+    names.extend(f'x_{i}_{j}' for i, j in index['edges'])
+    names.extend(f'v_{i}' for i, replica in zip(nodes, _replica_flags(graph, variables_rpp)) if not replica)
+    return names
+
+def write_clsd(file, graph, variables_rpp, p, transitivity=None):
+    # transitivity is the list of triples of (13) to include, all of them if None
     file.comment(f'writing a CLSD model for p={p}')
     file.comment('Now: {}'.format(datetime.datetime.now().astimezone()))
+    edges = graph_index(graph)['edges']
 
     file.comment('objective function')
     file.minimize('sum_connected')
 
+    names = clsd_column_names(graph, variables_rpp)
+    num_pairs = graph.number_of_nodes() * (graph.number_of_nodes() - 1) // 2 # the u_i_j come first
+    x_names, v_names = names[num_pairs:num_pairs + len(edges)], names[num_pairs + len(edges):]
+
     # (10)
     file.comment('sum distances for (10)')
-    file.write('sum_connected', end=False)
-    for i in graph.nodes(): # for all nodes
-        if variables_rpp[f'r_{i}'] == 0: # if node is not in the set of replicas
-            file.write(f' - v_{i}', end=False)
-    file.write(' = 0')
+    # for all nodes not in the set of replicas
+    file.write('sum_connected' + ''.join(f' - {name}' for name in v_names) + ' = 0')
     
     # (11)
     file.comment('ensuring p (11)')
-    first = True
-    for i, j in graph.edges(): # for set E, i < j
-        if first:
-            first = False
-        else:
-            file.write(' + ', end=False)
-        file.write(f'x_{i}_{j}', end=False)
-    file.write(f' = {p}')
-    
-    # (12)
-    for i,j in graph.edges():
-        file.write(f'u_{i}_{j} + x_{i}_{j} >= 1')
+    file.write('budget: ' + ' + '.join(x_names) + f' = {p}') # for set E, i < j
     
-    # (13)
-    file.comment('guarantee that non-adjascent nodes i and j are connected if there exists a node k that is connected to both')
-    for i in graph.nodes():
-        for j in graph.nodes():
-            if int(i) < int(j) and not graph.has_edge(i, j):
-                if graph.degree(i) <= graph.degree(j):
-                    v_ij = graph.neighbors(i)
-                else:
-                    v_ij = graph.neighbors(j)
-
-                for k in v_ij:
-                    if int(k) > int(j):
-                        file.write(f'u_{i}_{k} + u_{j}_{k} - u_{i}_{j} <= 1')
-                    elif int(k) > int(i):
-                        file.write(f'u_{i}_{k} + u_{k}_{j} - u_{i}_{j} <= 1')
-                    else:
-                        file.write(f'u_{k}_{i} + u_{k}_{j} - u_{i}_{j} <= 1')
-    
-    # (14) and (15)
-    for i in graph.nodes():
-        for j in graph.nodes():
-            if int(i) < int(j) and variables_rpp[f'r_{i}'] == 0 and variables_rpp[f'r_{j}'] == 1: # set F such that j in D
-                file.write(f'u_{i}_{j} - v_{i} <= 0')
-            if int(i) < int(j) and variables_rpp[f'r_{i}'] == 1 and variables_rpp[f'r_{j}'] == 0: # set F such that i in D
-                file.write(f'u_{i}_{j} - v_{j} <= 0')
+    # (12) to (15)
+    file.comment('u_i_j + x_i_j >= 1 for the links (12), non-adjascent nodes i and j are connected if there exists a node k that is '
+                 'connected to both (13), and u_i_j <= v for the pairs with one replica (14)-(15)')
+    model = clsd_matrix(graph, variables_rpp, transitivity=transitivity)
+    file.write_matrix(names, model['matrix'], model['senses'], model['rhs'])
     
     file.bounds()
     file.int_variables('sum_connected')
-    binary_variables = ''
-    for i,j in graph.edges():
-        binary_variables += f' x_{i}_{j}'
-    for i in graph.nodes(): # for all nodes
-        if variables_rpp[f'r_{i}'] == 0: # if node is not in the set of replicas
-            binary_variables += f' v_{i}'
-    for i in graph.nodes():
-        for j in graph.nodes:
-            if int(i) < int(j):
-                binary_variables += f' u_{i}_{j}'
-    file.binary_variables(binary_variables)
+    file.binary_variables(x_names + v_names + names[:num_pairs])
     file.close()
-    
-    variables_clsd = file.solve()
 
-    print('done for p', p)
-    print('found', len(variables_clsd), 'variables in the solution')
-    return variables_clsd
+def _replica_flags(graph, variables_rpp):
+    # boolean array telling which nodes (in the order of graph.nodes()) are replicas
+    if isinstance(variables_rpp, Solution) and 'r' in variables_rpp.arrays:
+        return np.asarray(variables_rpp.family('r') == 1)
+    return np.array([variables_rpp[f'r_{i}'] == 1 for i in graph.nodes()], dtype=bool)
+
+class Solution(Mapping):
+    # solution of the RPP or CLSD models storing each family of binary variables as an array indexed by
+    # the position of the nodes in graph.nodes() and of the links in graph.edges():
+    # r_q and v_i by node, x_i_j by link, y_q_s and u_i_j by pair of nodes, z_s_i_j by node and arc
+    # (link i->j of graph.edges() at position e, and link j->i at E + e). variables that are not in the
+    # model are stored as -1, e.g., v_i of the replicas. the families in sparse_families keep only the ones
+    # and are read as with nonzero=True, so that their zeros are not found, e.g., sparse_families=('u', 'z')
+    # for large topologies. other variables (sum_distance, objective_value, ...) are kept in `scalars`
+    # it can be read as the dict of variables returned by the solver, e.g., solution['u_12_47'], and names
+    # that are not in the model raise KeyError
+    families = {'r': 1, 'v': 1, 'x': 2, 'y': 2, 'u': 2, 'z': 3} # number of node labels in the name
+
+    def __init__(self, graph, variables, families=None, nonzero=False, sparse_families=()):
+        # families: names of the families to keep, all by default. nonzero=True keeps only the variables equal to 1
+        self.nodes = list(graph.nodes())
+        self.edges = list(graph.edges())
+        self.index = {node: idx for idx, node in enumerate(self.nodes)}
+        self.edge_index = {edge: idx for idx, edge in enumerate(self.edges)}
+        self.edge_index.update({(j, i): len(self.edges) + idx for idx, (i, j) in enumerate(self.edges)}) # reverse arcs
+        self.sparse_families = set(sparse_families)
+        self.nonzero = nonzero
+        self.scalars = {}
+        positions = {family: [] for family in self.families}
+        values = {family: [] for family in self.families}
+        for name, value in variables.items():
+            position = self.position(name)
+            if position is None:
+                self.scalars[name] = value
+            elif families is None or position[0] in families:
+                if value not in (0, 1):
+                    raise ValueError(f'variable {name} is not binary: {value}')
+                if value == 1 or not nonzero:
+                    positions[position[0]].append(position[1:])
+                    values[position[0]].append(value)
+        self.arrays = {}
+        for family in self.families:
+            if len(positions[family]) == 0 and (families is None or family not in families):
+                continue
+            shape = self.shape(family)
+            coordinates = tuple(np.array(positions[family], dtype=np.int64).reshape(-1, len(shape)).T)
+            if family in self.sparse_families:
+                ones = np.array(values[family]) == 1
+                self.arrays[family] = sparse.coo_matrix((np.ones(np.count_nonzero(ones), dtype=np.int8),
+                                                         tuple(c[ones] for c in coordinates)), shape=shape).tocsr()
+            else:
+                array = np.full(shape, -1, dtype=np.int8)
+                array[coordinates] = values[family]
+                self.arrays[family] = array
+
+    def shape(self, family):
+        num_nodes, num_arcs = len(self.nodes), 2 * len(self.edges)
+        return {'r': (num_nodes,), 'v': (num_nodes,), 'x': (len(self.edges),), 'y': (num_nodes, num_nodes),
+                'u': (num_nodes, num_nodes), 'z': (num_nodes, num_arcs)}[family]
+
+    def position(self, name):
+        # (family, positions...) of a variable name, or None if it is not in a family
+        labels = name.split('_')
+        if labels[0] not in self.families or len(labels) != self.families[labels[0]] + 1:
+            return None
+        if any(label not in self.index for label in labels[1:]):
+            return None
+        if labels[0] == 'x':
+            edge = self.edge_index.get((labels[1], labels[2]))
+            return None if edge is None or edge >= len(self.edges) else ('x', edge)
+        if labels[0] == 'z':
+            arc = self.edge_index.get((labels[2], labels[3]))
+            return None if arc is None else ('z', self.index[labels[1]], arc)
+        return (labels[0],) + tuple(self.index[label] for label in labels[1:])
+
+    def name(self, family, position):
+        if family == 'x':
+            return 'x_{}_{}'.format(*self.edges[position[0]])
+        if family == 'z':
+            i, j = self.edges[position[1] % len(self.edges)]
+            return f'z_{self.nodes[position[0]]}_{i}_{j}' if position[1] < len(self.edges) else f'z_{self.nodes[position[0]]}_{j}_{i}'
+        return '_'.join([family] + [self.nodes[p] for p in position])
+
+    def family(self, family):
+        # dense array of a family, with -1 for the variables that are not in the model (0 if stored as sparse)
+        array = self.arrays[family]
+        return array.toarray() if sparse.issparse(array) else array
+
+    def entries(self, family, nonzero=False):
+        # positions and values of the variables of a family that are in the model
+        array = self.arrays[family]
+        if sparse.issparse(array):
+            array = array.tocoo()
+            return list(zip(array.row, array.col)), array.data
+        positions = np.argwhere(array == 1 if nonzero else array >= 0)
+        return [tuple(p) for p in positions], array[tuple(positions.T)]
+
+    def to_dict(self, families=None, nonzero=False):
+        variables = dict(self.scalars)
+        for family in self.arrays:
+            if families is None or family in families:
+                positions, values = self.entries(family, nonzero)
+                variables.update(zip((self.name(family, p) for p in positions), values.tolist()))
+        return variables
+
+    def nbytes(self):
+        return sum(a.data.nbytes + a.indices.nbytes + a.indptr.nbytes if sparse.issparse(a) else a.nbytes for a in self.arrays.values())
+
+    def __getitem__(self, name):
+        if name in self.scalars:
+            return self.scalars[name]
+        position = self.position(name)
+        if position is None or position[0] not in self.arrays:
+            raise KeyError(name)
+        array = self.arrays[position[0]]
+        value = int(array[position[1:]])
+        if value == -1 or (value == 0 and (self.nonzero or sparse.issparse(array))):
+            raise KeyError(name)
+        return value
+
+    def __iter__(self):
+        yield from self.scalars
+        for family in self.arrays:
+            positions, _ = self.entries(family, nonzero=self.nonzero)
+            for p in positions:
+                yield self.name(family, p)
+
+    def __len__(self):
+        return len(self.scalars) + sum(len(self.entries(family, nonzero=self.nonzero)[0]) for family in self.arrays)
+
+def _edge_arrays(graph, store=True):
+    # node index and the arrays of edge endpoints, following the order of graph.edges()
+    index = graph_index(graph, store=store)
+    return index['node_index'], index['src'], index['dst']
+
+def _component_labels(cur_graph):
+    # the index of cur_graph is not stored in it, since a2tr and aca receive the states of an attack,
+    # i.e., graphs of the caller that change between calls
+    index, src, dst = _edge_arrays(cur_graph, store=False)
+    adjacency = sparse.coo_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(len(index), len(index)))
+    _, labels = connected_components(adjacency, directed=False)
+    return index, labels
+
+def _node_positions(index, original_graph):
+    # positions in the current graph of the nodes of original_graph that it still has
+    return np.fromiter((index[node] for node in original_graph.nodes() if node in index), dtype=np.int64)
 
 def a2tr(cur_graph, original_graph):
-    count = 0
-    for n1 in original_graph.nodes():
-        for n2 in original_graph.nodes():
-            if n1 != n2 and n1 in cur_graph.nodes() and n2 in cur_graph.nodes():
-                if n2 in nx.algorithms.descendants(cur_graph, n1):
-                    count += 1
+    index, labels = _component_labels(cur_graph)
+    sizes = np.bincount(labels[_node_positions(index, original_graph)])
+    count = int(np.sum(sizes * (sizes - 1)))
     return count / (original_graph.number_of_nodes() * (original_graph.number_of_nodes() - 1))
 
 def aca(cur_graph, original_graph):
+    index, labels = _component_labels(cur_graph)
+    positions = _node_positions(index, original_graph)
+    is_dc = np.zeros(len(labels), dtype=np.int64)
+    is_dc[[index[dc] for dc in set(original_graph.graph['dcs']) if dc in index]] = 1
+    num_dcs = np.bincount(labels, weights=is_dc, minlength=len(labels)) # DCs per component
+    other_dcs = num_dcs[labels[positions]] - is_dc[positions]
+    return int(np.count_nonzero(other_dcs > 0)) / original_graph.number_of_nodes()
+
+def _batch_labels(num_nodes, src, dst, edge_masks):
+    # component labels of all the states in edge_masks at once, as the blocks of a block-diagonal graph
+    # the labels of state s are at positions s * num_nodes to (s + 1) * num_nodes
+    num_states = edge_masks.shape[0]
+    state, edge = np.nonzero(edge_masks)
+    offset = state * num_nodes
+    adjacency = sparse.coo_matrix((np.ones(len(edge), dtype=np.int8), (src[edge] + offset, dst[edge] + offset)),
+                                  shape=(num_states * num_nodes, num_states * num_nodes))
+    _, labels = connected_components(adjacency, directed=False)
+    return labels
+
+def a2tr_aca_batch(graph, edge_masks, dcs=None):
+    # A2TR and ACA for many states of `graph`, each given as a boolean mask over graph.edges()
+    # telling which links are still up
+    if dcs is None:
+        dcs = graph.graph['dcs']
+    index, src, dst = _edge_arrays(graph)
+    num_nodes = len(index)
+    edge_masks = np.atleast_2d(np.asarray(edge_masks, dtype=bool))
+    num_states = edge_masks.shape[0]
+    if edge_masks.shape[1] != len(src):
+        raise ValueError(f'edge masks have {edge_masks.shape[1]} columns but the graph has {len(src)} edges')
+
+    labels = _batch_labels(num_nodes, src, dst, edge_masks)
+    sizes = np.bincount(labels)
+    label_state = np.empty(len(sizes), dtype=np.int64)
+    label_state[labels] = np.repeat(np.arange(num_states), num_nodes)
+    pairs = np.bincount(label_state, weights=sizes * (sizes - 1), minlength=num_states)
+
+    is_dc = np.zeros(num_nodes, dtype=np.int64)
+    is_dc[[index[dc] for dc in set(dcs) if dc in index]] = 1
+    is_dc = np.tile(is_dc, num_states)
+    num_dcs = np.bincount(labels, weights=is_dc, minlength=len(sizes)) # DCs per component
+    accessing = (num_dcs[labels] - is_dc > 0).reshape(num_states, num_nodes).sum(axis=1)
+
+    return pairs / (num_nodes * (num_nodes - 1)), accessing / num_nodes
+
+def attack_curves(graph, removal_order, dcs=None):
+    # A2TR and ACA after each link removal in `removal_order`, computed in a single
+    # pass by replaying the removals backwards as union-find merges.
+    # position 0 holds the values for the intact graph, position k after k removals
+    if dcs is None:
+        dcs = graph.graph['dcs']
+    index = {node: idx for idx, node in enumerate(graph.nodes())}
+    num_nodes = len(index)
+
+    removed = []
+    removed_keys = set()
+    for link in removal_order:
+        i, j = link[0], link[1]
+        if not graph.has_edge(i, j):
+            raise ValueError(f'link {i}-{j} is not in the graph')
+        key = (min(index[i], index[j]), max(index[i], index[j]))
+        if key in removed_keys:
+            raise ValueError(f'link {i}-{j} is removed more than once')
+        removed_keys.add(key)
+        removed.append(key)
+
+    parent = list(range(num_nodes))
+    size = [1] * num_nodes
+    num_dcs = [0] * num_nodes # number of distinct DCs in the component
+    for dc in set(dcs):
+        if dc in index:
+            num_dcs[index[dc]] = 1
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def accessing(s, d):
+        # nodes of a component of size s with d DCs that reach a DC other than themselves
+        if d == 0:
+            return 0
+        if d == 1:
+            return s - 1
+        return s
+
+    connected_pairs = 0 # ordered pairs of distinct connected nodes
+    accessing_nodes = sum(accessing(1, d) for d in num_dcs)
+
+    def merge(i, j):
+        nonlocal connected_pairs, accessing_nodes
+        root_i, root_j = find(i), find(j)
+        if root_i == root_j:
+            return
+        if size[root_i] < size[root_j]:
+            root_i, root_j = root_j, root_i
+        s_i, s_j, d_i, d_j = size[root_i], size[root_j], num_dcs[root_i], num_dcs[root_j]
+        connected_pairs += 2 * s_i * s_j
+        accessing_nodes += accessing(s_i + s_j, d_i + d_j) - accessing(s_i, d_i) - accessing(s_j, d_j)
+        parent[root_j] = root_i
+        size[root_i] = s_i + s_j
+        num_dcs[root_i] = d_i + d_j
+
+    for i, j in graph.edges():
+        key = (min(index[i], index[j]), max(index[i], index[j]))
+        if key not in removed_keys:
+            merge(*key)
+
+    pairs_values = np.zeros(len(removed) + 1, dtype=np.int64)
+    accessing_values = np.zeros(len(removed) + 1, dtype=np.int64)
+    pairs_values[-1] = connected_pairs
+    accessing_values[-1] = accessing_nodes
+    for step in range(len(removed) - 1, -1, -1):
+        merge(*removed[step])
+        pairs_values[step] = connected_pairs
+        accessing_values[step] = accessing_nodes
+
+    return pairs_values / (num_nodes * (num_nodes - 1)), accessing_values / num_nodes
+
+def _edge_dependencies(adjacency, source, num_edges):
+    # Brandes' accumulation of the edge betweenness due to `source` over an unweighted graph
+    # adjacency[node] maps each neighbor to the position of the edge between them
+    dependencies = np.zeros(num_edges)
+    sigma = [0] * len(adjacency)
+    distance = [-1] * len(adjacency)
+    predecessors = [[] for _ in range(len(adjacency))]
+    sigma[source] = 1
+    distance[source] = 0
+    visited = [source]
+    for node in visited: # breadth-first search, `visited` grows while iterating
+        for neighbor, edge in adjacency[node].items():
+            if distance[neighbor] < 0:
+                distance[neighbor] = distance[node] + 1
+                visited.append(neighbor)
+            if distance[neighbor] == distance[node] + 1:
+                sigma[neighbor] += sigma[node]
+                predecessors[neighbor].append((node, edge))
+    delta = [0.] * len(adjacency)
+    for node in reversed(visited):
+        coeff = (1 + delta[node]) / sigma[node]
+        for predecessor, edge in predecessors[node]:
+            c = sigma[predecessor] * coeff
+            dependencies[edge] += c
+            delta[predecessor] += c
+    return dependencies
+
+def adaptive_betweenness_order(graph, incremental=True):
+    # links in the order cut by an attacker that always removes the link with the highest
+    # edge betweenness in the current graph; ties go to the link listed first in graph.edges()
+    # the contribution of every source to every link is kept, and after a cut only the sources
+    # whose shortest-path DAG contained the removed link are recomputed. the other rows are
+    # unchanged bit by bit, so the order is the same as with incremental=False
+    index, src, dst = _edge_arrays(graph)
+    edges = list(graph.edges())
+    adjacency = [{} for _ in range(len(index))]
+    for edge, (i, j) in enumerate(zip(src, dst)):
+        adjacency[i][j] = edge
+        adjacency[j][i] = edge
+
+    contributions = np.array([_edge_dependencies(adjacency, s, len(edges)) for s in range(len(index))]).reshape(len(index), len(edges))
+    alive = np.ones(len(edges), dtype=bool)
+    order = []
+    for _ in range(len(edges)):
+        scores = contributions.sum(axis=0)
+        scores[~alive] = -1.
+        # first maximum, up to the rounding of the sums, so that exact ties go to the first link
+        edge = int(np.flatnonzero(scores >= scores.max() * (1 - 1e-9))[0])
+        order.append(edges[edge])
+        alive[edge] = False
+        del adjacency[src[edge]][dst[edge]]
+        del adjacency[dst[edge]][src[edge]]
+        affected = np.nonzero(contributions[:, edge] > 0)[0] if incremental else range(len(index))
+        for s in affected:
+            contributions[s] = _edge_dependencies(adjacency, s, len(edges))
+    return order
+
+attack_strategies = ['betweenness', 'degree', 'length', 'random', 'adaptive']
+
+def attack_order(graph, strategy, seed=None):
+    # order in which the attack `strategy` cuts the links of `graph`
+    # ties keep the order of graph.edges(), as in the notebooks
+    if strategy == 'betweenness': # static edge betweenness of the intact graph
+        scores = nxcentrality.edge_betweenness_centrality(graph)
+    elif strategy == 'degree': # links between high-degree nodes first
+        scores = {(i, j): graph.degree(i) + graph.degree(j) for i, j in graph.edges()}
+    elif strategy == 'length': # longest links first
+        scores = {(i, j): graph[i][j]['weight'] for i, j in graph.edges()}
+    elif strategy == 'random':
+        edges = list(graph.edges())
+        return [edges[idx] for idx in np.random.default_rng(seed).permutation(len(edges))]
+    elif strategy == 'adaptive': # edge betweenness recomputed after every cut
+        return adaptive_betweenness_order(graph)
+    else:
+        raise ValueError(f'unknown attack strategy {strategy}')
+    return [link for link, score in sorted(scores.items(), key=itemgetter(1), reverse=True)]
+
+def random_failure_aca(graph, failure_probability, batch_size=10000, min_scenarios=10000, max_scenarios=1000000, tolerance=1e-3, seed=None):
+    # expected A2TR and ACA under independent random link failures, estimated by Monte Carlo
+    # failure_probability is a single value, one value per link following graph.edges(), or the name of an edge attribute
+    # scenarios are sampled in batches and the running mean/variance is updated until the
+    # half-width of the 95% confidence interval of the ACA falls below `tolerance`
+    if isinstance(failure_probability, str):
+        failure_probability = [graph[i][j][failure_probability] for i, j in graph.edges()]
+    failure_probability = np.broadcast_to(np.asarray(failure_probability, dtype=float), (graph.number_of_edges(),))
+    rng = np.random.default_rng(seed)
+
     count = 0
-    for n1 in original_graph.nodes():
-        for dc in original_graph.graph['dcs']:
-            if n1 != dc and n1 in cur_graph.nodes() and dc in cur_graph.nodes():
-                if dc in nx.algorithms.descendants(cur_graph, n1):
-                    count += 1
-                    break # breaks the DC loop once finds a DC
-    return count / original_graph.number_of_nodes()
-
-    
\ No newline at end of file
+    mean = np.zeros(2) # A2TR, ACA
+    m2 = np.zeros(2) # sum of squared deviations from the mean
+    half_width = np.inf
+    while count < max_scenarios:
+        size = min(batch_size, max_scenarios - count)
+        masks = rng.random((size, len(failure_probability))) >= failure_probability # True for links that survive
+        values = np.vstack(a2tr_aca_batch(graph, masks))
+        batch_mean = values.mean(axis=1)
+        batch_m2 = ((values - batch_mean[:, None]) ** 2).sum(axis=1)
+        delta = batch_mean - mean
+        total = count + size
+        mean = mean + delta * size / total
+        m2 = m2 + batch_m2 + delta ** 2 * count * size / total
+        count = total
+        half_width = 1.96 * np.sqrt(m2[1] / (count - 1) / count) if count > 1 else np.inf
+        if count >= min_scenarios and half_width <= tolerance:
+            break
+
+    variance = m2 / (count - 1) if count > 1 else np.zeros(2)
+    return {'a2tr': float(mean[0]), 'a2tr_variance': float(variance[0]),
+            'aca': float(mean[1]), 'aca_variance': float(variance[1]), 'aca_half_width': float(half_width),
+            'scenarios': count, 'converged': bool(half_width <= tolerance)}
+
+_sweep_graph = None
+
+def _init_sweep_worker(graph):
+    global _sweep_graph
+    _sweep_graph = graph
+
+def _attack_task(task):
+    strategy, seed = task
+    order = attack_order(_sweep_graph, strategy, seed=seed)
+    a2tr_values, aca_values = attack_curves(_sweep_graph, order)
+    return order, a2tr_values, aca_values
+
+def attack_sweep(graph, strategies=attack_strategies, seeds=range(10), processes=None):
+    # evaluates every attack strategy over a process pool; 'random' runs once per seed
+    # returns, per strategy, the curves stacked as (runs, links + 1) arrays and the u-ACA of each run
+    tasks = [(strategy, seed) for strategy in strategies for seed in (seeds if strategy == 'random' else [None])]
+    if processes == 1:
+        _init_sweep_worker(graph)
+        outputs = [_attack_task(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes, initializer=_init_sweep_worker, initargs=(graph,)) as pool:
+            outputs = pool.map(_attack_task, tasks, chunksize=max(1, len(tasks) // (4 * (processes or os.cpu_count()))))
+
+    results = {}
+    for (strategy, seed), (order, a2tr_values, aca_values) in zip(tasks, outputs):
+        result = results.setdefault(strategy, {'seeds': [], 'orders': [], 'a2tr': [], 'aca': []})
+        result['seeds'].append(seed)
+        result['orders'].append(order)
+        result['a2tr'].append(a2tr_values)
+        result['aca'].append(aca_values)
+    for result in results.values():
+        result['a2tr'] = np.vstack(result['a2tr'])
+        result['aca'] = np.vstack(result['aca'])
+        result['mu_aca'] = result['aca'].mean(axis=1)
+    return results
@@ -1,47 +1,177 @@
 import os
 import datetime
+import importlib.util
 
-mode = None
-# identifying which solvers we have installed
-try:
-    from lpsolve55 import *
-    mode = 'lpsolve'
-    print('lpsolve supported')
-except:
-    print('lpsolve not supported')
-try:
-    import gurobipy as grb
-    mode = 'gurobi'
-    print('gurobi supported')
-except:
-    print('gurobi not supported')
-try:
-    import cplex
-    from cplex.exceptions import CplexSolverError
-    mode = 'cplex'
-    print('cplex supported')
-except:
-    print('CPLEX not supported')
+# supported solvers and their modules, in order of priority for the default mode
+# highs is the HiGHS solver bundled with SciPy (scipy.optimize.milp), which uses the CPLEX LP format
+solver_modules = {'cplex': 'cplex', 'gurobi': 'gurobipy', 'lpsolve': 'lpsolve55', 'highs': 'scipy'}
+solver_priority = ['cplex', 'gurobi', 'lpsolve', 'highs']
 
+# bound by load_solver when a solver is first used
+cplex = None
+CplexSolverError = None
+grb = None
+lpsolve = None
+optimize = None
+_loaded_solvers = set()
+_solver_versions = {}
+
+def solver_available(name):
+    # checks that the solver's module can be found, without importing it
+    try:
+        return importlib.util.find_spec(solver_modules[name]) is not None
+    except (ImportError, ValueError):
+        return False
+
+def available_solvers():
+    return [name for name in solver_priority if solver_available(name)]
+
+def default_mode():
+    # solver set in the CROSS_SOLVER environment variable, otherwise the installed one with the highest priority
+    if os.environ.get('CROSS_SOLVER'):
+        return os.environ['CROSS_SOLVER']
+    for name in solver_priority:
+        if solver_available(name):
+            return name
+    return None
+
+def set_mode(name):
+    # selects the solver used by models created without an explicit mode
+    global mode
+    if name not in solver_modules:
+        raise ValueError(f'unknown solver {name}')
+    mode = name
+
+def load_solver(name):
+    global cplex, CplexSolverError, grb, lpsolve, optimize
+    if name in _loaded_solvers:
+        return
+    if name == 'cplex':
+        import cplex as cplex_module
+        from cplex.exceptions import CplexSolverError as cplex_error
+        cplex, CplexSolverError = cplex_module, cplex_error
+    elif name == 'gurobi':
+        import gurobipy
+        grb = gurobipy
+    elif name == 'lpsolve':
+        from lpsolve55 import lpsolve as lpsolve_function
+        lpsolve = lpsolve_function
+    elif name == 'highs':
+        from scipy import optimize as scipy_optimize
+        if not hasattr(scipy_optimize, 'milp'):
+            raise ImportError('the highs mode requires SciPy 1.9 or newer')
+        optimize = scipy_optimize
+    else:
+        raise ValueError(f'unknown solver {name}')
+    _loaded_solvers.add(name)
+
+def solver_version(name):
+    # queried once per process
+    if name not in _solver_versions:
+        load_solver(name)
+        if name == 'cplex':
+            _solver_versions[name] = cplex.Cplex().get_version()
+        elif name == 'gurobi':
+            _solver_versions[name] = '.'.join(str(number) for number in grb.gurobi.version())
+        elif name == 'lpsolve':
+            _solver_versions[name] = '.'.join(str(number) for number in lpsolve('lp_solve_version'))
+        elif name == 'highs':
+            import scipy
+            _solver_versions[name] = f'SciPy {scipy.__version__}'
+    return _solver_versions[name]
+
+mode = default_mode()
+
+import re
+import itertools
+import hashlib
+import json
+import sqlite3
+import tempfile
+import time
 import numpy as np
 import sys
 import os
 
+class SolutionCache():
+    # solutions stored in an SQLite database, keyed by a hash of the model content and the solver parameters
+    # the database can be shared by concurrent processes; above max_bytes, the least recently used entries are evicted
+    def __init__(self, path='./models/solutions.sqlite', max_bytes=512 * 2**20):
+        self.path = path
+        self.max_bytes = max_bytes
+        with self.connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, variables TEXT, '
+                               'start_solving REAL, end_solving REAL, optimizer_version TEXT, size INTEGER, last_access REAL)')
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        return _Transaction(connection)
+
+    def get(self, key):
+        with self.connect() as connection:
+            row = connection.execute('SELECT variables, start_solving, end_solving, optimizer_version FROM solutions WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE solutions SET last_access = ? WHERE key = ?', (time.time(), key))
+        return {'variables': json.loads(row[0]),
+                'start_solving': datetime.datetime.fromtimestamp(row[1], datetime.timezone.utc),
+                'end_solving': datetime.datetime.fromtimestamp(row[2], datetime.timezone.utc),
+                'optimizer_version': row[3]}
+
+    def put(self, key, variables, start_solving, end_solving, optimizer_version):
+        content = json.dumps(variables, default=lambda value: value.item()) # numpy scalars
+        with self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (key, content, start_solving.timestamp(), end_solving.timestamp(), str(optimizer_version), len(content), time.time()))
+            total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM solutions').fetchone()[0]
+            if total > self.max_bytes:
+                evicted = []
+                for old_key, size in connection.execute('SELECT key, size FROM solutions WHERE key != ? ORDER BY last_access', (key,)).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((old_key,))
+                    total -= size
+                connection.executemany('DELETE FROM solutions WHERE key = ?', evicted)
+
+class _Transaction():
+    # runs the statements of a `with` block in one write transaction and closes the connection
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        self.connection.close()
+
+# cache used by every ModelFile that is not given one, see enable_cache
+default_cache = None
+
+def enable_cache(path='./models/solutions.sqlite', max_bytes=512 * 2**20):
+    global default_cache
+    default_cache = SolutionCache(path, max_bytes=max_bytes)
+    return default_cache
+
 class ModelFile():
-    def __init__(self, filename, name, mode='cplex', stdout=sys.stdout, threads=1):
+    def __init__(self, filename, name, mode=None, stdout=sys.stdout, threads=1, cache=None):
         assert stdout in [os.devnull, sys.stdout, 'log']
+        self.created = time.perf_counter()
+        # per-phase timings (seconds), model dimensions as seen by the solver and solver outcome,
+        # filled when closing and solving the model and appended to the .sol file
+        self.stats = {'write_seconds': None, 'lp_bytes': None, 'load_seconds': None, 'solve_seconds': None, 'extract_seconds': None,
+                      'rows': None, 'columns': None, 'nonzeros': None, 'status': None, 'mip_gap': None, 'mip_nodes': None, 'threads': threads}
         self.name = name
         self.filename = filename
-        self.file = open(filename + '.lp', 'w') # open with 'w' flag to write over existing file
-        self.mode = mode
-        self.integer = ''
-        self.binary = ''
-        self.optimizer_version = ''
-        if self.mode == 'cplex':
-            self.optimizer_version = cplex.Cplex().get_version()
+        self.mode = mode if mode is not None else globals()['mode'] # module default, see set_mode
+        self.integer = set() # names of the integer and binary variables
+        self.binary = set()
+        self.optimizer_version = '' # set when solving
         self.stdout = stdout
         self.threads = threads
-        if self.mode in ['cplex', 'gurobi']:
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.comment_start = '\\'
             self.comment_end = '\n'
             self.line_end = '\n'
@@ -51,21 +181,26 @@ class ModelFile():
             self.line_end = ';\n'
         else:
             raise ValueError('mode configured incorrectly')
+        self.file = self.open_file()
 
         self.comment(f'Date creation: {datetime.datetime.now(datetime.timezone.utc)} UTC')
         self.comment(f'Host: {os.uname()[1]}')
         self.start_solving = None
         self.end_solving = None
+        self.cache = cache if cache is not None else default_cache
             
+    def open_file(self):
+        return open(self.filename + '.lp', 'w') # open with 'w' flag to write over existing file
+
     def minimize(self, write):
-        if self.mode in ['cplex', 'gurobi']:
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.write(f'minimize {write}')
             self.write('subject to')
         elif self.mode == 'lpsolve':
             self.write(f'min: {write}')
             
     def maximize(self, write):
-        if self.mode in ['cplex', 'gurobi']:
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.write(f'maximize {write}')
             self.write('subject to')
         elif self.mode == 'lpsolve':
@@ -81,47 +216,136 @@ class ModelFile():
         self.file.write(self.line_end)
         
     def bounds(self):
-        if self.mode in ['cplex', 'gurobi']:
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.write('Bounds')
         
+    def write_lines(self, lines, chunk_size=10000):
+        # bulk version of write: writes an iterable of complete statements, joined in chunks
+        lines = iter(lines)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if len(chunk) == 0:
+                break
+            self.file.write(self.line_end.join(chunk) + self.line_end)
+
+    def write_matrix(self, names, matrix, senses, rhs, row_names=None):
+        # writes the constraints of a sparse matrix (scipy CSR), one row per statement
+        # names holds the variable of each column, senses 'L', 'G' or 'E' per row
+        symbols = {'L': '<=', 'G': '>=', 'E': '='}
+        names = list(names)
+        terms = [f'- {name}' if value == -1 else f'+ {name}' if value == 1 else f'- {-value} {name}' if value < 0 else f'+ {value} {name}'
+                 for value, name in zip(matrix.data.tolist(), map(names.__getitem__, matrix.indices.tolist()))]
+        indptr = matrix.indptr.tolist()
+        rhs = np.asarray(rhs, dtype=float)
+        integral = np.mod(rhs, 1) == 0
+        rhs = [int(value) if whole else value for value, whole in zip(rhs.tolist(), integral.tolist())]
+        lines = [' '.join(terms[start:end]) for start, end in zip(indptr[:-1], indptr[1:])]
+        lines = [f'{line[2:] if line[:2] == "+ " else line} {symbols[sense]} {value}' for line, sense, value in zip(lines, senses, rhs)]
+        if row_names is not None:
+            lines = [f'{name}: {line}' for name, line in zip(row_names, lines)]
+        self.write_lines(lines)
+
+    # variables are given either as a string separated by spaces or as an iterable of names
     def binary_variables(self, variables):
-        self.binary += ' ' + variables + ' '
-        if self.mode in ['cplex', 'gurobi']:
+        if isinstance(variables, str):
+            variables = variables.split()
+        variables = list(variables)
+        self.binary.update(variables)
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.write('Binary')
-            self.write(variables.strip().replace(' ', '\n'))
+            self.write_lines(variables)
         elif self.mode == 'lpsolve':
-            self.write(f'bin {variables.strip()}')
+            self.write('bin ' + ' '.join(variables))
             
     def int_variables(self, variables):
-        self.integer += ' ' + variables + ' '
-        if self.mode in ['cplex', 'gurobi']:
+        if isinstance(variables, str):
+            variables = variables.split()
+        variables = list(variables)
+        self.integer.update(variables)
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.write('General')
-            self.write(variables.strip().replace(' ', '\n'))
+            self.write_lines(variables)
         elif self.mode == 'lpsolve':
-            self.write(f'int {variables.strip()}')
+            self.write('int ' + ' '.join(variables))
         
     def close(self):
-        if self.mode in ['cplex', 'gurobi']:
+        if self.mode in ['cplex', 'gurobi', 'highs']:
             self.write('End')
         self.file.close()
+        self.stats['write_seconds'] = time.perf_counter() - self.created
+        self.stats['lp_bytes'] = os.path.getsize(self.filename + '.lp')
+
+    def start_phases(self):
+        # the phases add up over the solves of solve_rhs_sweep
+        self.stats.update(load_seconds=0., solve_seconds=0., extract_seconds=0., status=None, mip_gap=None, mip_nodes=None)
+
+    def end_phase(self, phase, start):
+        # adds the time since start to the phase and returns the start of the next one
+        end = time.perf_counter()
+        self.stats[phase] += end - start
+        return end
+
+    def set_dimensions(self, rows, columns, nonzeros):
+        self.stats.update(rows=int(rows), columns=int(columns), nonzeros=int(nonzeros))
         
+    def prepare_solver(self):
+        load_solver(self.mode)
+        self.optimizer_version = solver_version(self.mode)
+
+    def cplex_instance(self):
+        c = cplex.Cplex()
+        c.parameters.threads.set(self.threads)
+        if self.stdout == os.devnull:
+            c.set_results_stream(open(os.devnull, 'w'))
+            c.set_log_stream(open(os.devnull, 'w'))
+        elif self.stdout == sys.stdout:
+            c.set_results_stream(sys.stdout)
+            c.set_log_stream(sys.stdout)
+        elif self.stdout == 'log':
+            out = open(self.filename + '.log', 'w')
+            c.set_results_stream(out)
+            c.set_log_stream(out)
+        return c
+
+    def gurobi_env(self):
+        gurobi_env = grb.Env()
+        gurobi_env.setParam('Threads', self.threads)
+        if self.stdout == os.devnull:
+            gurobi_env.setParam('OutputFlag', 0)
+        elif self.stdout == sys.stdout:
+            gurobi_env.setParam('OutputFlag', 1)
+        elif self.stdout == 'log':
+            gurobi_env.setParam('OutputFlag', 0)
+            gurobi_env.setParam('LogFile', self.filename + '.log')
+        return gurobi_env
+
+    # the load_* methods hand the model to each solver; here through the LP file
+    def load_cplex(self, c):
+        c.read(self.filename + '.lp')
+
+    def load_gurobi(self, gurobi_env):
+        return grb.read(self.filename + '.lp', gurobi_env)
+
+    def load_lpsolve(self):
+        lp = lpsolve('read_lp_file', self.filename + '.lp')
+        lpsolve('set_lp_name', lp, self.name)
+        return lp
+
+    def load_highs(self):
+        model = SparseModel()
+        model.read_lp_file(self.filename + '.lp', comment_start=self.comment_start)
+        return model
+
     def solve_pool(self, gap=0.1):
+        self.prepare_solver()
+        self.start_phases()
         self.start_solving = datetime.datetime.now(datetime.timezone.utc)
         if self.mode == 'cplex':
-            c = cplex.Cplex()
-            c.parameters.threads.set(self.threads)
-            if self.stdout == os.devnull:
-                c.set_results_stream(open(os.devnull, 'w'))
-                c.set_log_stream(open(os.devnull, 'w'))
-            elif self.stdout == sys.stdout:
-                c.set_results_stream(sys.stdout)
-                c.set_log_stream(sys.stdout)
-            elif self.stdout == 'log':
-                out = open(self.filename + '.log', 'w')
-                c.set_results_stream(out)
-                c.set_log_stream(out)
-
-            c.read(self.filename + '.lp')
+            c = self.cplex_instance()
+            start = time.perf_counter()
+            self.load_cplex(c)
+            start = self.end_phase('load_seconds', start)
+            self.cplex_dimensions(c)
 
             try:
                 c.solve()
@@ -129,8 +353,10 @@ class ModelFile():
             except CplexSolverError:
                 print("Exception raised during solve")
                 return None
+            self.end_phase('solve_seconds', start)
 
             status = c.solution.get_status()
+            self.cplex_outcome(c)
             if status == c.solution.status.unbounded:
                 print("Model is unbounded")
                 return None
@@ -159,132 +385,336 @@ class ModelFile():
                     for name, value in zip(c.variables.get_names(), c.solution.pool.get_values(sol)):
                         variables[sol+1][name] = np.absolute(np.rint(value))
             return variables
-        elif self.mode == 'gurobi':
-            self.end_solving = datetime.datetime.now(datetime.timezone.utc)
-            return None
-        elif self.mode == 'lpsolve':
+        elif self.mode in ['gurobi', 'lpsolve', 'highs']:
             self.end_solving = datetime.datetime.now(datetime.timezone.utc)
             return None
         
-    def solve(self):
+    def model_digest(self):
+        # hash of the LP file without the comments, which hold the creation date and host
+        digest = hashlib.sha256()
+        comment_start = self.comment_start.encode()
+        with open(self.filename + '.lp', 'rb') as f:
+            for line in f:
+                if not line.startswith(comment_start):
+                    digest.update(line)
+        return digest.hexdigest()
+
+    def cache_key(self):
+        parameters = json.dumps({'mode': self.mode, 'threads': self.threads}, sort_keys=True)
+        return hashlib.sha256((self.model_digest() + parameters).encode()).hexdigest()
+
+    def solve(self, mip_start=None, cutoff=None):
+        # mip_start is an optional dict from variable names to (partial) starting values, used by cplex and gurobi
+        # cutoff is an optional bound on the objective value: solutions worse than it are discarded
+        if self.cache is None:
+            return self.solve_model(mip_start, cutoff)
+        key = self.cache_key()
+        cached = self.cache.get(key)
+        if cached is not None:
+            print('Solution found in the cache')
+            self.stats['status'] = 'cached'
+            self.variables = cached['variables']
+            self.start_solving = cached['start_solving']
+            self.end_solving = cached['end_solving']
+            self.optimizer_version = cached['optimizer_version']
+            return self.variables
+        variables = self.solve_model(mip_start, cutoff)
+        if variables is not None:
+            self.cache.put(key, variables, self.start_solving, self.end_solving, self.optimizer_version)
+        return variables
+
+    def solve_model(self, mip_start=None, cutoff=None):
+        self.prepare_solver()
+        self.start_phases()
         self.start_solving = datetime.datetime.now(datetime.timezone.utc)
         if self.mode == 'cplex':
-            c = cplex.Cplex()
-            c.parameters.threads.set(self.threads)
-            if self.stdout == os.devnull:
-                c.set_results_stream(open(os.devnull, 'w'))
-                c.set_log_stream(open(os.devnull, 'w'))
-            elif self.stdout == sys.stdout:
-                c.set_results_stream(sys.stdout)
-                c.set_log_stream(sys.stdout)
-            elif self.stdout == 'log':
-                out = open(self.filename + '.log', 'w')
-                c.set_results_stream(out)
-                c.set_log_stream(out)
-
-            c.read(self.filename + '.lp')
+            c = self.cplex_instance()
+            start = time.perf_counter()
+            self.load_cplex(c)
+            self.end_phase('load_seconds', start)
+            self.cplex_dimensions(c)
+            if mip_start is not None:
+                self.cplex_start(c, mip_start)
+            if cutoff is not None:
+                if c.objective.get_sense() == c.objective.sense.minimize:
+                    c.parameters.mip.tolerances.uppercutoff.set(cutoff)
+                else:
+                    c.parameters.mip.tolerances.lowercutoff.set(cutoff)
+            return self.run_cplex(c)
+        elif self.mode == 'gurobi':
+            gurobi_env = self.gurobi_env()
+            start = time.perf_counter()
+            model = self.load_gurobi(gurobi_env)
+            self.end_phase('load_seconds', start)
+            self.set_dimensions(model.NumConstrs, model.NumVars, model.NumNZs)
+            if mip_start is not None:
+                self.gurobi_start(model, mip_start)
+            if cutoff is not None:
+                model.Params.Cutoff = cutoff
+            return self.run_gurobi(model)
+        elif self.mode == 'lpsolve': # lpsolve and milp take no MIP start
+            start = time.perf_counter()
+            lp = self.load_lpsolve()
+            self.end_phase('load_seconds', start)
+            self.lpsolve_dimensions(lp)
+            if cutoff is not None:
+                lpsolve('set_obj_bound', lp, cutoff)
+            variables = self.run_lpsolve(lp)
+            lpsolve('delete_lp', lp)
+            return variables
+        elif self.mode == 'highs':
+            start = time.perf_counter()
+            model = self.load_highs()
+            self.end_phase('load_seconds', start) # the conversion to arrays is added by run_highs
+            return self.run_highs(model, cutoff=cutoff)
+
+    def solve_rhs_sweep(self, constraint, values, mip_start=None):
+        # solves the model once for each value of the right-hand side of the named `constraint`,
+        # loading the model into the solver only once. mip_start(previous_variables, value) can
+        # return (partial) starting values for the next solve from the previous solution
+        # returns a dict from each value to its variables
+        self.prepare_solver()
+        self.start_phases()
+        self.start_solving = datetime.datetime.now(datetime.timezone.utc)
+        if self.mode == 'cplex':
+            c = self.cplex_instance()
+            start = time.perf_counter()
+            self.load_cplex(c)
+            self.end_phase('load_seconds', start)
+            self.cplex_dimensions(c)
+        elif self.mode == 'gurobi':
+            gurobi_env = self.gurobi_env()
+            start = time.perf_counter()
+            model = self.load_gurobi(gurobi_env)
+            self.end_phase('load_seconds', start)
+            self.set_dimensions(model.NumConstrs, model.NumVars, model.NumNZs)
+            row = model.getConstrByName(constraint)
+        elif self.mode == 'lpsolve':
+            start = time.perf_counter()
+            lp = self.load_lpsolve()
+            self.end_phase('load_seconds', start)
+            self.lpsolve_dimensions(lp)
+            row = lpsolve('get_nameindex', lp, constraint, True)
+        elif self.mode == 'highs':
+            start = time.perf_counter()
+            model = self.load_highs()
+            self.end_phase('load_seconds', start)
+            row = model.row_index(constraint)
+        solutions = {}
+        previous = None
+        for value in values:
+            start = None
+            if mip_start is not None and previous is not None:
+                start = mip_start(previous, value)
+            if self.mode == 'cplex':
+                c.linear_constraints.set_rhs(constraint, value)
+                if start is not None:
+                    self.cplex_start(c, start)
+                solutions[value] = self.run_cplex(c)
+            elif self.mode == 'gurobi':
+                row.RHS = value
+                if start is not None:
+                    self.gurobi_start(model, start)
+                solutions[value] = self.run_gurobi(model)
+            elif self.mode == 'lpsolve': # lpsolve takes no MIP start
+                lpsolve('set_rh', lp, row, value)
+                solutions[value] = self.run_lpsolve(lp)
+            elif self.mode == 'highs': # milp takes no MIP start
+                model.set_rhs(row, value)
+                solutions[value] = self.run_highs(model)
+            if solutions[value] is not None:
+                previous = solutions[value]
+        if self.mode == 'lpsolve':
+            lpsolve('delete_lp', lp)
+        return solutions
+
+    def cplex_start(self, c, start):
+        if c.MIP_starts.get_num() > 0:
+            c.MIP_starts.delete()
+        names = set(c.variables.get_names())
+        start = {name: value for name, value in start.items() if name in names} # skips entries such as objective_value
+        c.MIP_starts.add(cplex.SparsePair(ind=list(start.keys()), val=[float(value) for value in start.values()]),
+                         c.MIP_starts.effort_level.solve_MIP)
 
+    def gurobi_start(self, model, start):
+        model.NumStart = 0
+        for var in model.getVars():
+            var.Start = start.get(var.varName, grb.GRB.UNDEFINED)
+        model.update()
+
+    # the run_* methods solve a model already loaded into the solver and extract the variables
+    # model dimensions and outcome of the solve in each solver, see stats
+    def cplex_dimensions(self, c):
+        self.set_dimensions(c.linear_constraints.get_num(), c.variables.get_num(), c.linear_constraints.get_num_nonzeros())
+
+    def cplex_outcome(self, c):
+        self.stats['status'] = c.solution.get_status_string()
+        if c.problem_type[c.get_problem_type()] != 'LP':
+            self.stats['mip_nodes'] = c.solution.progress.get_num_nodes_processed()
             try:
-                c.solve()
-                self.end_solving = datetime.datetime.now(datetime.timezone.utc)
-            except CplexSolverError:
-                print("Exception raised during solve")
-                return None
+                self.stats['mip_gap'] = c.solution.MIP.get_mip_relative_gap()
+            except CplexSolverError: # no integer solution
+                pass
 
-            status = c.solution.get_status()
-            if status == c.solution.status.unbounded:
-                print("Model is unbounded")
-                return None
+    def lpsolve_dimensions(self, lp):
+        self.set_dimensions(lpsolve('get_Nrows', lp), lpsolve('get_Ncolumns', lp), lpsolve('get_nonzeros', lp))
 
-            if status == c.solution.status.infeasible:
-                print("Model is infeasible")
-                return None
+    def run_cplex(self, c):
+        start = time.perf_counter()
+        try:
+            c.solve()
+            self.end_solving = datetime.datetime.now(datetime.timezone.utc)
+        except CplexSolverError:
+            print("Exception raised during solve")
+            return None
+        start = self.end_phase('solve_seconds', start)
 
-            if status == c.solution.status.infeasible_or_unbounded:
-                print("Model is infeasible or unbounded")
-                return None
+        status = c.solution.get_status()
+        self.cplex_outcome(c)
+        if status == c.solution.status.unbounded:
+            print("Model is unbounded")
+            return None
 
+        if status == c.solution.status.infeasible:
+            print("Model is infeasible")
+            return None
+
+        if status == c.solution.status.infeasible_or_unbounded:
+            print("Model is infeasible or unbounded")
+            return None
+
+        self.variables = {}
+        self.variables['objective_value'] = c.solution.get_objective_value()
+        if status == c.solution.status.optimal or status == c.solution.status.MIP_optimal:
+            print('Model solved successfully!')
+            integral = self.binary | self.integer
+            for name, value in zip(c.variables.get_names(), c.solution.get_values()):
+                if name in integral:
+                    self.variables[name] = int(np.rint(value))
+                else:
+                    self.variables[name] = value
+        self.end_phase('extract_seconds', start)
+        return self.variables
+
+    def run_gurobi(self, model):
+        start = time.perf_counter()
+        model.optimize()
+        self.end_solving = datetime.datetime.now(datetime.timezone.utc)
+        start = self.end_phase('solve_seconds', start)
+        self.stats['status'] = model.Status
+        if model.IsMIP:
+            self.stats['mip_nodes'] = model.NodeCount
+            if model.SolCount > 0:
+                self.stats['mip_gap'] = model.MIPGap
+
+        if model.status == grb.GRB.Status.INFEASIBLE:
+            print('Optimization was stopped with status %d' % model.status, 'infeasible')
+            return None
+        elif model.status == grb.GRB.Status.OPTIMAL:
+            print('model solved successfully')
             self.variables = {}
-            self.variables['objective_value'] = c.solution.get_objective_value()
-            if status == c.solution.status.optimal or status == c.solution.status.MIP_optimal:
-                print('Model solved successfully!')
-                for name, value in zip(c.variables.get_names(), c.solution.get_values()):
-                    if ' ' + name + ' ' in self.binary or ' ' + name + ' ' in self.integer:
-                        self.variables[name] = int(np.rint(value))
-                    else:
-                        self.variables[name] = value
+            solution_vars = model.getVars()
+#             print('solution vars', len(solution_vars))
+            integral = self.binary | self.integer
+            for var in solution_vars:
+                if var.varName in integral:
+                    self.variables[var.varName] = int(np.rint(var.x))
+                else:
+                    self.variables[var.varName] = var.x
+            self.end_phase('extract_seconds', start)
             return self.variables
-        elif self.mode == 'gurobi':
-            gurobi_env = grb.Env()
-            gurobi_env.setParam('Threads', self.threads)
-            if self.stdout == os.devnull:
-                gurobi_env.setParam('OutputFlag', 0)
-            elif self.stdout == sys.stdout:
-                gurobi_env.setParam('OutputFlag', 1)
-            elif self.stdout == 'log':
-                gurobi_env.setParam('OutputFlag', 0)
-                gurobi_env.setParam('LogFile', self.filename + '.log')
-            
-            model = grb.read(self.filename + '.lp', gurobi_env)
-            model.optimize()
-            self.end_solving = datetime.datetime.now(datetime.timezone.utc)
+        else:
+            print('model was not optimized')
+            return None
 
-            if model.status == grb.GRB.Status.INFEASIBLE:
-                print('Optimization was stopped with status %d' % model.status, 'infeasible')
-                return None
-            elif model.status == grb.GRB.Status.OPTIMAL:
-                print('model solved successfully')
-                self.variables = {}
-                solution_vars = model.getVars()
-#                 print('solution vars', len(solution_vars))
-                for var in solution_vars:
-                    if ' ' + name + ' ' in self.binary or ' ' + name + ' ' in self.integer:
-                        self.variables[var.varName] = int(np.rint(var.x))
-                    else:
-                        self.variables[var.varName] = var.x
-                return self.variables
+    def run_lpsolve(self, lp):
+        start = time.perf_counter()
+        status = lpsolve('solve', lp)
+        self.end_solving = datetime.datetime.now(datetime.timezone.utc)
+        start = self.end_phase('solve_seconds', start)
+        self.stats['status'] = status # lpsolve does not report the gap reached
+        self.stats['mip_nodes'] = lpsolve('get_total_nodes', lp)
+        if status == 3:
+            print("Model is unbounded")
+            return
+        if status == 2:
+            print("Model is infeasible")
+            return
+        if status == 4:
+            print("The model is degenerative")
+            return
+        if status == -2:
+            print("Out of memory")
+            return
+        if status == 1:
+            print("The model is sub-optimal")
+            return
+        if status == 4:
+            print("The model is degenerative")
+            return
+        if status == 5:
+            print("Numerical failure encountered")
+            return
+        if status == 25:
+            print("Accuracy error encountered")
+            return
+
+        self.variables = {}
+        integral = self.binary | self.integer
+        for name, value in zip(lpsolve('get_col_names', lp), lpsolve('get_solution', lp)[1]):
+            if name in integral:
+                self.variables[name] = int(np.rint(value))
             else:
-                print('model was not optimized')
-                return None
-        elif self.mode == 'lpsolve':
-            lp = lpsolve('read_lp_file', self.filename + '.lp')
-            lpsolve('set_lp_name', lp, self.name)
-            status = lpsolve('solve', lp)
-            self.end_solving = datetime.datetime.now(datetime.timezone.utc)
-            if status == 3:
-                print("Model is unbounded")
-                return
-            if status == 2:
-                print("Model is infeasible")
-                return
-            if status == 4:
-                print("The model is degenerative")
-                return
-            if status == -2:
-                print("Out of memory")
-                return
-            if status == 1:
-                print("The model is sub-optimal")
-                return
-            if status == 4:
-                print("The model is degenerative")
-                return
-            if status == 5:
-                print("Numerical failure encountered")
-                return
-            if status == 25:
-                print("Accuracy error encountered")
-                return
-            
-            self.variables = {}
-            for name, value in zip(lpsolve('get_col_names', lp), lpsolve('get_solution', lp)[1]):
-                if ' ' + name + ' ' in self.binary or ' ' + name + ' ' in self.integer:
+                self.variables[name] = value
+        self.end_phase('extract_seconds', start)
+        return self.variables
+        
+    def run_highs(self, model, cutoff=None):
+        # SciPy does not expose the HiGHS thread count nor a log file, only its output to stdout
+        # milp has no cutoff parameter, so the cutoff is added as a bound on the objective row
+        start = time.perf_counter()
+        arrays = dict(model.to_arrays()) # the cutoff row must not be added to the cached arrays
+        start = self.end_phase('load_seconds', start)
+        self.set_dimensions(arrays['matrix'].shape[0], arrays['matrix'].shape[1], arrays['matrix'].nnz)
+        sign = -1. if model.objective_sense == 'maximize' else 1.
+        if cutoff is not None:
+            from scipy import sparse
+            arrays['matrix'] = sparse.vstack([arrays['matrix'], sparse.csr_matrix(sign * arrays['objective'])], format='csr')
+            arrays['senses'] = np.append(arrays['senses'], 'L')
+            arrays['rhs'] = np.append(arrays['rhs'], sign * cutoff)
+        row_lower = np.where(arrays['senses'] == 'L', -np.inf, arrays['rhs'])
+        row_upper = np.where(arrays['senses'] == 'G', np.inf, arrays['rhs'])
+        result = optimize.milp(sign * arrays['objective'], integrality=(arrays['types'] != 'C').astype(np.uint8),
+                               bounds=optimize.Bounds(arrays['lower'], arrays['upper']),
+                               constraints=optimize.LinearConstraint(arrays['matrix'], row_lower, row_upper),
+                               options={'disp': self.stdout == sys.stdout})
+        self.end_solving = datetime.datetime.now(datetime.timezone.utc)
+        start = self.end_phase('solve_seconds', start)
+        self.stats.update(status=result.message, mip_gap=getattr(result, 'mip_gap', None), mip_nodes=getattr(result, 'mip_node_count', None),
+                          threads=None) # chosen by HiGHS
+        if result.status == 2:
+            print("Model is infeasible")
+            return None
+        if result.status == 3:
+            print("Model is unbounded")
+            return None
+        if result.x is None:
+            print('model was not optimized:', result.message)
+            return None
+
+        self.variables = {}
+        self.variables['objective_value'] = sign * result.fun
+        if result.status == 0:
+            print('Model solved successfully!')
+            integral = self.binary | self.integer | model.binary | model.integer
+            for name, value in zip(arrays['names'], result.x):
+                if name in integral:
                     self.variables[name] = int(np.rint(value))
                 else:
                     self.variables[name] = value
-            lpsolve('delete_lp', lp)
-            return self.variables
-        
+        self.end_phase('extract_seconds', start)
+        return self.variables
+
     def write_solution(self):
         with open(self.filename + '.sol', 'w') as f:
             solving_time = self.end_solving - self.start_solving # datetime.timedelta
@@ -293,7 +723,385 @@ class ModelFile():
             print(f'# computer: {os.uname()[1]}', file=f)
             print(f'# solving time: {solving_time}', file=f)
             print(f'# solving time (seconds): {solving_time.total_seconds()}', file=f)
-            print(f'# {mode} version: {self.optimizer_version}', file=f)
+            print(f'# {self.mode} version: {self.optimizer_version}', file=f)
+            for key, value in self.stats.items():
+                print(f'# {key}: {value}', file=f)
             for name, value in self.variables.items():
                 print(f'{name} {value}', file=f)
 
+
+_term = re.compile(r'\s*([+-]?)\s*((?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)?\s*\*?\s*([A-Za-z_][\w.]*)')
+_sense = re.compile(r'(<=|>=|=<|=>|<|>|=)')
+_objective = re.compile(r'^(minimize|maximize|minimise|maximise|minimum|maximum|min|max)\s*:?\s*(.*)$', re.IGNORECASE | re.DOTALL)
+_senses = {'<=': 'L', '=<': 'L', '<': 'L', '>=': 'G', '=>': 'G', '>': 'G', '=': 'E'}
+_sections = {'subject to': 'constraints', 'such that': 'constraints', 'st': 'constraints', 's.t.': 'constraints',
+             'bounds': 'bounds', 'bound': 'bounds',
+             'binary': 'binary', 'binaries': 'binary', 'bin': 'binary',
+             'general': 'general', 'generals': 'general', 'gen': 'general',
+             'end': 'end'}
+
+class SparseModel():
+    # linear model kept in memory as sparse rows, built from the statements written by ModelFile
+    # in either the CPLEX or the lpsolve LP format, or from whole matrices with add_matrix
+    # the rows are kept as blocks of CSR arrays, stacked by to_arrays, whose result is cached until the model changes
+    def __init__(self):
+        self.columns = {} # variable name -> column position
+        self.objective = {}
+        self.objective_sense = 'minimize'
+        self.blocks = [] # dicts with the CSR arrays, senses, rhs and row_names (None for the default names) of consecutive rows
+        self.pending = None # rows added one at a time by add_row, moved to a block by flush_rows
+        self.num_rows = 0
+        self.arrays = None # cached result of to_arrays
+        self.lower = {}
+        self.upper = {}
+        self.binary = set()
+        self.integer = set()
+        self.section = 'objective'
+
+    def column(self, name):
+        if name not in self.columns:
+            self.columns[name] = len(self.columns)
+        return self.columns[name]
+
+    def parse_expression(self, expression):
+        terms = {}
+        position = 0
+        for match in _term.finditer(expression):
+            if match.start() != position:
+                break
+            position = match.end()
+            column = self.column(match.group(3))
+            value = float(match.group(2)) if match.group(2) else 1.
+            terms[column] = terms.get(column, 0.) + (-value if match.group(1) == '-' else value)
+        if expression[position:].strip():
+            raise ValueError(f'could not parse the expression: {expression}')
+        return terms
+
+    def add_row(self, terms, sense, rhs, name=None):
+        if self.pending is None:
+            self.pending = {'indptr': [0], 'indices': [], 'data': [], 'senses': [], 'rhs': [], 'row_names': []}
+        self.pending['row_names'].append(name if name is not None else f'c{self.num_rows + 1}')
+        self.pending['indices'].extend(terms.keys())
+        self.pending['data'].extend(terms.values())
+        self.pending['indptr'].append(len(self.pending['indices']))
+        self.pending['senses'].append(sense)
+        self.pending['rhs'].append(rhs)
+        self.num_rows += 1
+        self.arrays = None
+
+    def flush_rows(self):
+        if self.pending is not None:
+            self.blocks.append({'data': np.array(self.pending['data'], dtype=float), 'indices': np.array(self.pending['indices'], dtype=np.int64),
+                                'indptr': np.array(self.pending['indptr'], dtype=np.int64), 'senses': np.array(self.pending['senses'], dtype='U1'),
+                                'rhs': np.array(self.pending['rhs'], dtype=float), 'row_names': self.pending['row_names']})
+            self.pending = None
+
+    def add_matrix(self, names, matrix, senses, rhs, row_names=None):
+        # appends the rows of a sparse matrix (scipy CSR) whose columns are the variables in names
+        names = list(names)
+        positions = np.fromiter(map(self.columns.get, names, itertools.repeat(-1)), dtype=np.int64, count=len(names))
+        new = np.nonzero(positions < 0)[0]
+        positions[new] = len(self.columns) + np.arange(len(new))
+        self.columns.update(zip([names[column] for column in new.tolist()], positions[new].tolist()))
+        self.flush_rows()
+        self.blocks.append({'data': np.array(matrix.data, dtype=float), 'indices': positions[matrix.indices],
+                            'indptr': np.array(matrix.indptr, dtype=np.int64), 'senses': np.array(senses, dtype='U1'),
+                            'rhs': np.array(rhs, dtype=float), 'row_names': list(row_names) if row_names is not None else None})
+        self.num_rows += matrix.shape[0]
+        self.arrays = None
+
+    def declare(self, section, names):
+        # names of binary or integer variables, without parsing them as statements
+        (self.binary if section == 'binary' else self.integer).update(names)
+        self.arrays = None
+
+    def row_index(self, name):
+        return self.to_arrays()['row_names'].index(name)
+
+    def set_rhs(self, row, value):
+        # changes the right-hand side of a row in place, keeping the cached arrays
+        self.to_arrays()['rhs'][row] = value
+
+    def read_bound(self, statement):
+        parts = _sense.split(statement)
+        if len(parts) == 1: # name free
+            words = statement.split()
+            if len(words) != 2 or words[1].lower() != 'free':
+                raise ValueError(f'could not parse the bound: {statement}')
+            self.lower[self.column(words[0])] = -np.inf
+            return
+        if len(parts) == 5: # lower <= name <= upper
+            column = self.column(parts[2].strip())
+            self.lower[column] = float(parts[0])
+            self.upper[column] = float(parts[4])
+            return
+        column = self.column(parts[0].strip())
+        value = float(parts[2])
+        if _senses[parts[1]] in ['L', 'E']:
+            self.upper[column] = value
+        if _senses[parts[1]] in ['G', 'E']:
+            self.lower[column] = value
+
+    def read_statement(self, statement):
+        statement = statement.strip().rstrip(';').strip()
+        if not statement:
+            return
+        self.arrays = None
+        keyword = statement.lower()
+        if keyword in _sections:
+            self.section = _sections[keyword]
+            return
+        if self.section == 'objective':
+            match = _objective.match(statement)
+            if match is not None:
+                self.objective_sense = 'maximize' if match.group(1).lower().startswith('max') else 'minimize'
+                expression = match.group(2)
+                if ':' in expression: # named objective
+                    expression = expression.split(':', 1)[1]
+                self.objective = self.parse_expression(expression)
+                self.section = 'constraints'
+                return
+        head = keyword.split(None, 1)
+        if len(head) == 2 and head[0] in ['bin', 'int', 'free']: # lpsolve declarations
+            names = statement.split(None, 1)[1].replace(',', ' ').split()
+            if head[0] == 'free':
+                self.lower.update((self.column(name), -np.inf) for name in names)
+            else:
+                (self.binary if head[0] == 'bin' else self.integer).update(names)
+            return
+        if self.section == 'binary':
+            self.binary.update(statement.split())
+        elif self.section == 'general':
+            self.integer.update(statement.split())
+        elif self.section == 'bounds':
+            self.read_bound(statement)
+        elif self.section == 'constraints':
+            name = None
+            if ':' in statement:
+                name, statement = statement.split(':', 1)
+                name = name.strip()
+            parts = _sense.split(statement)
+            if len(parts) != 3:
+                raise ValueError(f'could not parse the constraint: {statement}')
+            self.add_row(self.parse_expression(parts[0]), _senses[parts[1]], float(parts[2]), name=name)
+
+    def digest(self):
+        model = self.to_arrays()
+        digest = hashlib.sha256()
+        digest.update('\n'.join(model['names']).encode())
+        digest.update(self.objective_sense.encode())
+        for key in ['objective', 'lower', 'upper', 'types', 'senses', 'rhs']:
+            digest.update(model[key].tobytes())
+        for array in [model['matrix'].indptr, model['matrix'].indices]: # scipy may store them as int32
+            digest.update(array.astype(np.int64).tobytes())
+        digest.update(model['matrix'].data.tobytes())
+        return digest.hexdigest()
+
+    def read_lp_file(self, filename, comment_start='\\'):
+        # CPLEX LP format as written by ModelFile, with one statement per line
+        with open(filename) as f:
+            for line in f:
+                if not line.startswith(comment_start):
+                    self.read_statement(line)
+
+    def to_arrays(self):
+        # column names, objective, bounds, types ('C', 'B' or 'I'), CSR constraint matrix, senses and right-hand sides
+        # the arrays are cached and shared by the callers, who must not modify them (see set_rhs)
+        if self.arrays is not None:
+            return self.arrays
+        from scipy import sparse
+        for name in self.binary | self.integer:
+            self.column(name)
+        self.flush_rows()
+        names = list(self.columns.keys())
+        objective = np.zeros(len(names))
+        objective[list(self.objective.keys())] = list(self.objective.values())
+        types = np.full(len(names), 'C')
+        types[np.fromiter(map(self.columns.__getitem__, self.integer), dtype=np.int64, count=len(self.integer))] = 'I'
+        types[np.fromiter(map(self.columns.__getitem__, self.binary), dtype=np.int64, count=len(self.binary))] = 'B'
+        lower = np.zeros(len(names))
+        upper = np.where(types == 'B', 1., np.inf)
+        lower[list(self.lower.keys())] = list(self.lower.values())
+        upper[list(self.upper.keys())] = list(self.upper.values())
+
+        blocks = [sparse.csr_matrix((block['data'], block['indices'], block['indptr']), shape=(len(block['rhs']), len(names)))
+                  for block in self.blocks]
+        if len(blocks) == 0:
+            matrix = sparse.csr_matrix((0, len(names)))
+        else:
+            matrix = blocks[0] if len(blocks) == 1 else sparse.vstack(blocks, format='csr')
+        row_names = []
+        for block in self.blocks:
+            first = len(row_names)
+            row_names.extend(block['row_names'] if block['row_names'] is not None else [f'c{first + row + 1}' for row in range(len(block['rhs']))])
+        senses = np.concatenate([block['senses'] for block in self.blocks]) if self.blocks else np.array([], dtype='U1')
+        rhs = np.concatenate([block['rhs'] for block in self.blocks]) if self.blocks else np.array([], dtype=float)
+        # the stacked rows replace the blocks, so that set_rhs also changes the rows kept for later calls
+        self.blocks = [{'data': matrix.data, 'indices': matrix.indices, 'indptr': matrix.indptr, 'senses': senses, 'rhs': rhs, 'row_names': row_names}]
+        self.arrays = {'names': names, 'objective': objective, 'lower': lower, 'upper': upper, 'types': types,
+                       'matrix': matrix, 'senses': senses, 'rhs': rhs, 'row_names': row_names}
+        return self.arrays
+
+class MemoryModelFile(ModelFile):
+    # same interface as ModelFile, but the model is kept in memory and handed to the solver through
+    # its API instead of being written to and parsed back from an .lp file
+    # export_lp=True also writes the .lp file, for debugging
+    def __init__(self, filename, name, mode=None, stdout=sys.stdout, threads=1, cache=None, export_lp=False):
+        self.export_lp = export_lp
+        self.model = SparseModel()
+        self.statement = []
+        super().__init__(filename, name, mode=mode, stdout=stdout, threads=threads, cache=cache)
+
+    def open_file(self):
+        if self.export_lp:
+            return super().open_file()
+        return None
+
+    def comment(self, comment):
+        if self.file is not None:
+            super().comment(comment)
+
+    def write(self, write, end=True):
+        if self.file is not None:
+            super().write(write, end=end)
+        self.statement.append(write)
+        if end:
+            self.model.read_statement(''.join(self.statement))
+            self.statement = []
+
+    def new_line(self):
+        self.write('')
+
+    def write_lines(self, lines, chunk_size=10000):
+        lines = iter(lines)
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if len(chunk) == 0:
+                break
+            if self.file is not None:
+                super().write_lines(chunk, chunk_size=chunk_size)
+            if self.model.section in ['binary', 'general']: # variable names, no need to parse them
+                self.model.declare(self.model.section, chunk)
+            else:
+                for statement in chunk:
+                    self.model.read_statement(statement)
+
+    def write_matrix(self, names, matrix, senses, rhs, row_names=None):
+        if self.file is not None: # exporting, the rows are parsed back while written through write_lines
+            super().write_matrix(names, matrix, senses, rhs, row_names=row_names)
+        else:
+            self.model.add_matrix(names, matrix, senses, rhs, row_names=row_names)
+
+    def close(self):
+        if self.mode in ['cplex', 'gurobi', 'highs']:
+            self.write('End')
+        if self.file is not None:
+            self.file.close()
+            self.stats['lp_bytes'] = os.path.getsize(self.filename + '.lp')
+        self.stats['write_seconds'] = time.perf_counter() - self.created
+
+    def model_digest(self):
+        return self.model.digest()
+
+    def load_highs(self):
+        return self.model
+
+    def load_cplex(self, c):
+        model = self.model.to_arrays()
+        matrix = model['matrix']
+        if self.model.objective_sense == 'maximize':
+            c.objective.set_sense(c.objective.sense.maximize)
+        else:
+            c.objective.set_sense(c.objective.sense.minimize)
+        upper = [cplex.infinity if np.isinf(value) else value for value in model['upper']]
+        lower = [-cplex.infinity if np.isinf(value) else value for value in model['lower']]
+        if np.any(model['types'] != 'C'):
+            c.variables.add(obj=model['objective'].tolist(), lb=lower, ub=upper, types=''.join(model['types']), names=model['names'])
+        else:
+            c.variables.add(obj=model['objective'].tolist(), lb=lower, ub=upper, names=model['names'])
+        rows = [cplex.SparsePair(ind=matrix.indices[matrix.indptr[r]:matrix.indptr[r+1]].tolist(),
+                                 val=matrix.data[matrix.indptr[r]:matrix.indptr[r+1]].tolist()) for r in range(matrix.shape[0])]
+        c.linear_constraints.add(lin_expr=rows, senses=''.join(model['senses']), rhs=model['rhs'].tolist(), names=model['row_names'])
+
+    def load_gurobi(self, gurobi_env):
+        model = self.model.to_arrays()
+        gurobi_model = grb.Model(self.name, env=gurobi_env)
+        x = gurobi_model.addMVar(len(model['names']), lb=np.maximum(model['lower'], -grb.GRB.INFINITY),
+                                 ub=np.minimum(model['upper'], grb.GRB.INFINITY), obj=model['objective'],
+                                 vtype=model['types'], name=model['names'])
+        gurobi_senses = {'L': grb.GRB.LESS_EQUAL, 'G': grb.GRB.GREATER_EQUAL, 'E': grb.GRB.EQUAL}
+        gurobi_model.addMConstr(model['matrix'], x, np.array([gurobi_senses[sense] for sense in model['senses']]), model['rhs'],
+                                name=model['row_names'])
+        gurobi_model.ModelSense = grb.GRB.MAXIMIZE if self.model.objective_sense == 'maximize' else grb.GRB.MINIMIZE
+        gurobi_model.update()
+        return gurobi_model
+
+    def load_lpsolve(self):
+        model = self.model.to_arrays()
+        matrix = model['matrix']
+        lp = lpsolve('make_lp', 0, len(model['names']))
+        lpsolve('set_lp_name', lp, self.name)
+        for column, name in enumerate(model['names']):
+            lpsolve('set_col_name', lp, column + 1, name)
+        lpsolve('set_obj_fn', lp, model['objective'].tolist())
+        if self.model.objective_sense == 'maximize':
+            lpsolve('set_maxim', lp)
+        else:
+            lpsolve('set_minim', lp)
+        lpsolve_senses = {'L': 1, 'G': 2, 'E': 3} # LE, GE and EQ in lpsolve
+        lpsolve('set_add_rowmode', lp, True)
+        for r in range(matrix.shape[0]):
+            start, end = matrix.indptr[r], matrix.indptr[r+1]
+            lpsolve('add_constraintex', lp, matrix.data[start:end].tolist(), (matrix.indices[start:end] + 1).tolist(),
+                    lpsolve_senses[model['senses'][r]], float(model['rhs'][r]))
+        lpsolve('set_add_rowmode', lp, False)
+        for row, name in enumerate(model['row_names']): # e.g., the budget row changed by solve_rhs_sweep
+            lpsolve('set_row_name', lp, row + 1, name)
+        for column in range(len(model['names'])):
+            if model['types'][column] == 'B':
+                lpsolve('set_binary', lp, column + 1, True)
+            elif model['types'][column] == 'I':
+                lpsolve('set_int', lp, column + 1, True)
+            if model['lower'][column] != 0:
+                lpsolve('set_lowbo', lp, column + 1, -1e30 if np.isinf(model['lower'][column]) else float(model['lower'][column]))
+            if model['types'][column] != 'B' and not np.isinf(model['upper'][column]):
+                lpsolve('set_upbo', lp, column + 1, float(model['upper'][column]))
+        return lp
+
+def check_lp_parser(directory=None):
+    # writes a small model with ModelFile in the CPLEX and lpsolve formats, parses it back with
+    # SparseModel and compares it with the known arrays; run with `python cross_solver.py`
+    if directory is None:
+        directory = tempfile.mkdtemp()
+    for file_mode in ['highs', 'lpsolve']: # highs writes the CPLEX format
+        file = ModelFile(os.path.join(directory, f'check-{file_mode}'), 'check', mode=file_mode, stdout=os.devnull)
+        file.minimize('2 x + 3 y - z + b + n')
+        file.write('c1: x + y >= 1')
+        file.write('c2: x - z + 4 b <= 4')
+        file.write('c3: y + 2.5 z - n = 3')
+        if file_mode == 'lpsolve':
+            file.write('free y')
+            upper = [np.inf, np.inf, np.inf, 1., np.inf]
+        else:
+            file.bounds()
+            file.write_lines(['0 <= x <= 10', 'y free', 'z <= 5', 'n <= 7'])
+            upper = [10., np.inf, 5., 1., 7.]
+        file.binary_variables('b')
+        file.int_variables('n')
+        file.close()
+
+        model = SparseModel()
+        model.read_lp_file(file.filename + '.lp', comment_start=file.comment_start)
+        arrays = model.to_arrays()
+        expected = {'names': ['x', 'y', 'z', 'b', 'n'], 'objective': [2., 3., -1., 1., 1.], 'lower': [0., -np.inf, 0., 0., 0.],
+                    'upper': upper, 'types': ['C', 'C', 'C', 'B', 'I'],
+                    'matrix': [[1., 1., 0., 0., 0.], [1., 0., -1., 4., 0.], [0., 1., 2.5, 0., -1.]],
+                    'senses': ['G', 'L', 'E'], 'rhs': [1., 4., 3.], 'row_names': ['c1', 'c2', 'c3']}
+        arrays['matrix'] = arrays['matrix'].toarray()
+        for key, value in expected.items():
+            if not np.array_equal(np.asarray(arrays[key]), np.asarray(value)):
+                raise ValueError(f'the {file_mode} LP file was parsed with {key} {arrays[key]} instead of {value}')
+    print('LP parser check passed')
+
+if __name__ == '__main__':
+    check_lp_parser()
@@ -2,14 +2,14 @@
 # 
 
 import networkx as nx
-import matplotlib.pyplot as plt
 
-from xml.dom.minidom import parse
-import xml.dom.minidom
+from xml.etree import ElementTree
 import math
 import numpy as np
+from scipy import sparse
 
 import os
+import tempfile
 
 def calculate_geographical_distance(latlong1, latlong2):
     R = 6373.0
@@ -28,37 +28,221 @@ def calculate_geographical_distance(latlong1, latlong2):
     length = R * c
     return length
 
-def read_file(file, topology_name):
+def calculate_geographical_distances(latlong1, latlong2):
+    # same as calculate_geographical_distance for arrays of coordinates with shape (..., 2)
+    R = 6373.0
+
+    latlong1 = np.radians(np.asarray(latlong1, dtype=float))
+    latlong2 = np.radians(np.asarray(latlong2, dtype=float))
+    lat1, lon1 = latlong1[..., 0], latlong1[..., 1]
+    lat2, lon2 = latlong2[..., 0], latlong2[..., 1]
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return R * c
+
+def geographical_distance_matrix(latlong):
+    # great-circle distance between every pair of the (N, 2) coordinates, e.g., graph_index(graph)['pos']
+    latlong = np.asarray(latlong, dtype=float)
+    return calculate_geographical_distances(latlong[:, None, :], latlong[None, :, :])
+
+def read_file(file, topology_name, index=False, cache=True):
+    # index=True also attaches the integer-indexed arrays of graph_index to graph.graph['index']
+    # cache=True reuses the graph parsed before from the binary cache next to the file (see write_cache)
+    if cache:
+        graph = read_cache(file, topology_name)
+        if graph is not None:
+            if not index:
+                graph.graph.pop('index')
+            return graph
     if file.endswith('.xml'):
-        return read_sndlib_topology(file, topology_name)
-    with open(file, 'r') as nodes_lines:
-        for idx, line in enumerate(nodes_lines):
-            if line.replace("\n", "") == "1":
-                return read_txt_file(file, topology_name)
+        graph = read_sndlib_topology(file, topology_name)
+    else:
+        graph = None
+        with open(file, 'r') as nodes_lines:
+            for idx, line in enumerate(nodes_lines):
+                if line.replace("\n", "") == "1":
+                    graph = read_txt_file(file, topology_name)
+                    break
+    if graph is not None:
+        if cache:
+            write_cache(file, graph)
+        if index:
+            graph_index(graph)
+        else:
+            graph.graph.pop('index', None)
+    return graph
+
+cache_version = 1
+
+def cache_file(file):
+    return file + '.cache.npz'
+
+def cache_key(file):
+    # path, size and modification time of the topology file
+    status = os.stat(file)
+    return os.path.abspath(file), status.st_size, status.st_mtime_ns
+
+def write_cache(file, graph):
+    # stores the graph read from `file` in a .npz file next to it, without pickle. the file is written
+    # to a temporary file and then renamed, so concurrent readers never see a partial cache
+    index = graph_index(graph)
+    path, size, mtime = cache_key(file)
+    arrays = {'version': np.array(cache_version), 'path': np.array(path), 'size': np.array(size), 'mtime': np.array(mtime),
+              'nodes': np.array(index['nodes'], dtype=str), 'names': np.array([graph.nodes[n]['name'] for n in index['nodes']], dtype=str),
+              'pos': index['pos'], 'src': index['src'], 'dst': index['dst'], 'weight': index['weight'],
+              'edge_id': np.array([graph[i][j]['id'] for i, j in index['edges']]), 'insertion': _insertion_order(index),
+              'indptr': index['indptr'], 'indices': index['indices'], 'edge_of': index['edge_of']}
+    if 'coordinatesType' in graph.graph: # SNDlib topologies
+        arrays['coordinates_type'] = np.array(graph.graph['coordinatesType'])
+        arrays['max_latlong'] = graph.graph['max_latlong']
+        arrays['min_latlong'] = graph.graph['min_latlong']
+        arrays['node_names'] = np.array(list(graph.graph['node_indices'].keys()), dtype=str)
+        arrays['node_labels'] = np.array(list(graph.graph['node_indices'].values()), dtype=str)
+    try:
+        descriptor, temporary = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(os.path.abspath(file)))
+        with os.fdopen(descriptor, 'wb') as output:
+            np.savez(output, **arrays)
+        os.replace(temporary, cache_file(file))
+    except OSError as error:
+        print('could not write the topology cache:', error)
+
+def read_cache(file, topology_name):
+    # graph stored by write_cache, or None if there is no cache or the file changed since
+    try:
+        with np.load(cache_file(file), allow_pickle=False) as arrays:
+            arrays = dict(arrays)
+    except (OSError, ValueError):
+        return None
+    if int(arrays['version']) != cache_version or (str(arrays['path']), int(arrays['size']), int(arrays['mtime'])) != cache_key(file):
+        return None
+    graph = nx.Graph(name=topology_name)
+    nodes = arrays['nodes'].tolist()
+    for node, name, pos in zip(nodes, arrays['names'].tolist(), arrays['pos'].tolist()):
+        graph.add_node(node, name=name, pos=tuple(pos))
+    src, dst, weight, edge_id = arrays['src'], arrays['dst'], arrays['weight'].tolist(), arrays['edge_id'].tolist()
+    for edge in arrays['insertion']: # same order as the reader, so that graph.edges() and graph.neighbors() are the same
+        graph.add_edge(nodes[src[edge]], nodes[dst[edge]], id=edge_id[edge], weight=weight[edge])
+    edges = list(graph.edges())
+    if edges != [(nodes[i], nodes[j]) for i, j in zip(src, dst)]:
+        return None
+    if 'coordinates_type' in arrays:
+        graph.graph['coordinatesType'] = str(arrays['coordinates_type'])
+        graph.graph['max_latlong'] = arrays['max_latlong']
+        graph.graph['min_latlong'] = arrays['min_latlong']
+        graph.graph['node_indices'] = dict(zip(arrays['node_names'].tolist(), arrays['node_labels'].tolist()))
+    graph.graph['index'] = _index_from_arrays(nodes, edges, src, dst, arrays['weight'], arrays['pos'],
+                                              arrays['indptr'], arrays['indices'], arrays['edge_of'])
+    return graph
+
+def _insertion_order(index):
+    # an order of the links that, added one by one, gives every node its neighbors in the same order
+    # as in the graph: the link to each neighbor comes after the link to the previous neighbor
+    num_edges = len(index['src'])
+    after = [[] for _ in range(num_edges)]
+    before = np.zeros(num_edges, dtype=np.int64)
+    for node in range(len(index['nodes'])):
+        links = index['edge_of'][index['indptr'][node]:index['indptr'][node + 1]]
+        for first, second in zip(links[:-1], links[1:]):
+            after[first].append(second)
+            before[second] += 1
+    order = []
+    ready = [edge for edge in range(num_edges) if before[edge] == 0]
+    while len(ready) > 0:
+        edge = ready.pop()
+        order.append(edge)
+        for following in after[edge]:
+            before[following] -= 1
+            if before[following] == 0:
+                ready.append(following)
+    return np.array(order, dtype=np.int64)
+
+def graph_index(graph, rebuild=False, store=True):
+    # integer-indexed representation of the graph, following the order of graph.nodes() and graph.edges():
+    # nodes (labels), node_index (label to position), ids (labels as integers, None if not numeric),
+    # edges (labels), src and dst (positions of the endpoints), weight, pos (NaN if missing) and the
+    # CSR adjacency: indptr, indices (neighbors in the order of graph.neighbors), edge_of (position of
+    # the link of each neighbor) and adjacency (sparse matrix with the weights)
+    # it is kept in graph.graph['index'] (unless store=False) and rebuilt when the nodes, links or weights
+    # of the graph change, or with rebuild=True
+    index = graph.graph.get('index')
+    edges = list(graph.edges())
+    weight = np.array([value for _, _, value in graph.edges(data='weight', default=1.)], dtype=float)
+    same_links = index is not None and len(index['nodes']) == graph.number_of_nodes() and index['edges'] == edges
+    if not rebuild and same_links and np.array_equal(index['weight'], weight):
+        return index
+    nodes = list(graph.nodes())
+    node_index = {node: idx for idx, node in enumerate(nodes)}
+    endpoints = np.array([(node_index[i], node_index[j]) for i, j in edges], dtype=np.int64).reshape(-1, 2)
+    pos = np.array([graph.nodes[node].get('pos', (np.nan, np.nan)) for node in nodes], dtype=float).reshape(-1, 2)
+    edge_position = {}
+    for idx, (i, j) in enumerate(endpoints):
+        edge_position[(i, j)] = edge_position[(j, i)] = idx
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    indices, edge_of = [], []
+    for idx, node in enumerate(nodes):
+        neighbors = [node_index[neighbor] for neighbor in graph.neighbors(node)]
+        indices.extend(neighbors)
+        edge_of.extend(edge_position[(idx, neighbor)] for neighbor in neighbors)
+        indptr[idx + 1] = len(indices)
+    index = _index_from_arrays(nodes, edges, endpoints[:, 0], endpoints[:, 1], weight, pos, indptr,
+                               np.array(indices, dtype=np.int64), np.array(edge_of, dtype=np.int64))
+    if store:
+        graph.graph['index'] = index
+    return index
+
+def _index_from_arrays(nodes, edges, src, dst, weight, pos, indptr, indices, edge_of):
+    try:
+        ids = np.array([int(node) for node in nodes], dtype=np.int64)
+    except ValueError:
+        ids = None
+    return {'nodes': nodes, 'node_index': {node: idx for idx, node in enumerate(nodes)}, 'ids': ids, 'edges': edges,
+            'src': src, 'dst': dst, 'weight': weight, 'pos': pos, 'indptr': indptr, 'indices': indices, 'edge_of': edge_of,
+            'adjacency': sparse.csr_matrix((weight[edge_of], indices, indptr), shape=(len(nodes), len(nodes)))}
 
 def read_txt_file(file, topology_name):
     graph = nx.Graph(name=topology_name)
     nNodes = 0
     nLinks = 0
+    links = []
     with open(file, 'r') as nodes_lines:
         for idx, line in enumerate(nodes_lines):
             if idx > 2 and idx <= nNodes + 2: # skip title line
                 info = line.replace("\n", "").replace(',', '.').split("\t")
                 graph.add_node(info[0], name=info[1], pos=(float(info[2]), float(info[3])))
             elif idx > 2 + nNodes and idx <= 2 + nNodes + nLinks: # skip title line
-                info = line.replace("\n", "").split("\t")
-                n1 = graph.nodes[info[1]]
-                n2 = graph.nodes[info[2]]
-                dist = calculate_geographical_distance(n1['pos'], n2['pos'])
-#                 print(n1['name'], n1['pos'], n2['name'], n2['pos'], '{:.2f}'.format(dist), info[3])
-                final_distance = float('{:.2f}'.format(max(dist, float(info[3]))))
-                graph.add_edge(info[1], info[2], id=int(info[0]), weight=final_distance)
+                links.append(line.replace("\n", "").split("\t"))
             elif idx == 1:
                 nNodes = int(line)
             elif idx == 2:
                 nLinks = int(line)
+    # the length of a link is the largest between the one in the file and the geographical distance
+    latlong1 = np.array([graph.nodes[info[1]]['pos'] for info in links], dtype=float).reshape(-1, 2)
+    latlong2 = np.array([graph.nodes[info[2]]['pos'] for info in links], dtype=float).reshape(-1, 2)
+    distances = calculate_geographical_distances(latlong1, latlong2)
+    for info, dist in zip(links, distances.tolist()):
+        final_distance = float('{:.2f}'.format(max(dist, float(info[3]))))
+        graph.add_edge(info[1], info[2], id=int(info[0]), weight=final_distance)
     return graph
 
+def write_txt_file(graph, file):
+    # writes the graph in the tab-separated format read by read_txt_file
+    # coordinates use a decimal comma as in the shipped files, while lengths use a decimal point
+    with open(file, 'w') as txt_file:
+        txt_file.write('1\n{}\n{}\n'.format(graph.number_of_nodes(), graph.number_of_edges()))
+        for node, data in graph.nodes(data=True):
+            txt_file.write('{}\t{}\t{}\t{}\n'.format(node, data.get('name', node),
+                                                    '{:.2f}'.format(data['pos'][0]).replace('.', ','),
+                                                    '{:.2f}'.format(data['pos'][1]).replace('.', ',')))
+        for idx, (n1, n2, data) in enumerate(graph.edges(data=True)):
+            length = '{:.2f}'.format(data['weight']).rstrip('0').rstrip('.')
+            txt_file.write('{}\t{}\t{}\t{}\n'.format(data.get('id', idx + 1), n1, n2, length))
+        txt_file.write('\n')
+
 def read_simmons_txt(file):
     graph = nx.Graph()
     topology_name = file.split(".")[0]
@@ -78,50 +262,73 @@ def read_simmons_txt(file):
                 nLinks = int(line)
     return graph
 
-def read_sndlib_topology(file, topology_name):
+def _local_name(tag):
+    # tag without the XML namespace, e.g., {http://sndlib.zib.de/network}node -> node
+    return tag.rsplit('}', 1)[-1]
+
+def _first_text(element, name):
+    for child in element.iter():
+        if _local_name(child.tag) == name:
+            return child.text
+    return None
+
+def read_sndlib_topology(file, topology_name, demands=False):
+    # reads the nodes and links (and the demands if demands=True) of an SNDlib XML file in a single
+    # streaming pass, clearing every element once it is read
+    # nodes are labeled 1, 2, ... in the order of the file, and graph.graph['node_indices'] maps the
+    # SNDlib ids to these labels. demands go to graph.graph['demands'] as dicts with id, source, target and value
     graph = nx.Graph(name=topology_name)
 
     max_lat = np.finfo(0.0).min
     max_lng = np.finfo(0.0).min
     min_lat = np.finfo(0.0).max
     min_lng = np.finfo(0.0).max
-    with open(file) as file:
-        tree = xml.dom.minidom.parse(file)
-        document = tree.documentElement
-
-        graph.graph["coordinatesType"] = document.getElementsByTagName("nodes")[0].getAttribute("coordinatesType")
-
-        nodes = document.getElementsByTagName("node")
-        node_names = {}
-        for idn, node in enumerate(nodes):
-            x = node.getElementsByTagName("x")[0]
-            y = node.getElementsByTagName("y")[0]
-            # print(node['id'], x.string, y.string)
-            node_names[node.getAttribute("id")] = str(idn+1)
-            graph.add_node(str(idn+1), name=node.getAttribute("id"), pos=((float(x.childNodes[0].data), float(y.childNodes[0].data))))
-        print("Total nodes: ", graph.number_of_nodes())
-
-        links = document.getElementsByTagName("link")
-        for link in links:
-            source = link.getElementsByTagName("source")[0]
-            target = link.getElementsByTagName("target")[0]
-
-            if graph.graph["coordinatesType"] == "geographical":
-                length = np.around(calculate_geographical_distance(graph.nodes[node_names[source.childNodes[0].data]]["pos"], graph.nodes[node_names[target.childNodes[0].data]]["pos"]), 3)
-                max_lat = max(max_lat, graph.nodes[node_names[source.childNodes[0].data]]["pos"][0])
-                max_lng = max(max_lng, graph.nodes[node_names[source.childNodes[0].data]]["pos"][1])
-                min_lat = min(min_lat, graph.nodes[node_names[source.childNodes[0].data]]["pos"][0])
-                min_lng = min(min_lng, graph.nodes[node_names[source.childNodes[0].data]]["pos"][1])
-            else:
-                latlong1 = graph.nodes[node_names[source.childNodes[0].data]]["pos"]
-                latlong2 = graph.nodes[node_names[target.childNodes[0].data]]["pos"]
-                length = np.around(math.sqrt((latlong1[0] - latlong2[0]) ** 2 + (latlong1[1] - latlong2[1]) ** 2), 3)
-
-            graph.add_edge(node_names[source.childNodes[0].data], node_names[target.childNodes[0].data], id=link.getAttribute("id"), weight=length)
-        print("Total edges: ", graph.number_of_edges())
+    node_names = {}
+    links = []
+    demand_list = []
+    for event, element in ElementTree.iterparse(file, events=('start', 'end')):
+        name = _local_name(element.tag)
+        if event == 'start':
+            if name == 'nodes' and 'coordinatesType' not in graph.graph:
+                graph.graph["coordinatesType"] = element.get("coordinatesType", "")
+            continue
+        if name == 'node':
+            node_names[element.get("id")] = str(len(node_names) + 1)
+            graph.add_node(node_names[element.get("id")], name=element.get("id"),
+                           pos=(float(_first_text(element, "x")), float(_first_text(element, "y"))))
+            element.clear()
+        elif name == 'link':
+            links.append((element.get("id"), _first_text(element, "source"), _first_text(element, "target")))
+            element.clear()
+        elif name == 'demand':
+            if demands:
+                demand_list.append({'id': element.get("id"), 'source': _first_text(element, "source"),
+                                    'target': _first_text(element, "target"), 'value': float(_first_text(element, "demandValue"))})
+            element.clear()
+    print("Total nodes: ", graph.number_of_nodes())
+
+    sources = [node_names[source] for _, source, _ in links]
+    targets = [node_names[target] for _, _, target in links]
+    latlong1 = np.array([graph.nodes[source]["pos"] for source in sources], dtype=float).reshape(-1, 2)
+    latlong2 = np.array([graph.nodes[target]["pos"] for target in targets], dtype=float).reshape(-1, 2)
+    if graph.graph["coordinatesType"] == "geographical":
+        lengths = np.around(calculate_geographical_distances(latlong1, latlong2), 3)
+        if len(links) > 0:
+            max_lat, max_lng = np.maximum([max_lat, max_lng], latlong1.max(axis=0))
+            min_lat, min_lng = np.minimum([min_lat, min_lng], latlong1.min(axis=0))
+    else:
+        lengths = np.around(np.sqrt((latlong1[:, 0] - latlong2[:, 0]) ** 2 + (latlong1[:, 1] - latlong2[:, 1]) ** 2), 3)
+
+    for (link_id, _, _), source, target, length in zip(links, sources, targets, lengths):
+        graph.add_edge(source, target, id=link_id, weight=length)
+    print("Total edges: ", graph.number_of_edges())
     graph.graph["max_latlong"] = np.array([max_lat, max_lng])
     graph.graph["min_latlong"] = np.array([min_lat, min_lng])
     graph.graph["node_indices"] = node_names
+    if demands:
+        for demand in demand_list:
+            demand['source'], demand['target'] = node_names[demand['source']], node_names[demand['target']]
+        graph.graph["demands"] = demand_list
     return graph
 
 # read_simmons_txt("usnet.txt")
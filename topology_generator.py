@@ -0,0 +1,141 @@
+# Author: Carlos Natalino
+#
+# Generates synthetic geographic topologies in the format of topologies/*.txt
+# usage: python topology_generator.py 1000 --seed 1 --output topologies/synthetic-1000.txt
+
+import argparse
+
+import networkx as nx
+import numpy as np
+from scipy.spatial import Delaunay
+
+import reader
+
+# the nodes are placed inside this box of (lon, lat), which roughly covers continental Europe
+default_area = (-10., 30., 36., 60.)
+
+def generate_topology(num_nodes, seed=None, area=default_area, mean_degree=3.2, max_degree=5, waxman_alpha=0.4):
+    # builds a 2-edge-connected planar-like topology with node degrees between 2 and max_degree:
+    # 1. random node locations inside the area
+    # 2. Gabriel graph of the locations, i.e., the usual model for fiber deployments
+    # 3. bridges removed by adding the shortest Delaunay links that make the graph 2-edge-connected
+    # 4. links removed (longest first, Waxman-like) until the mean degree and max degree are met,
+    #    never removing a link whose removal would break the 2-edge-connectivity
+    if num_nodes < 3:
+        raise ValueError('at least 3 nodes are needed for a 2-edge-connected topology')
+    rng = np.random.default_rng(seed)
+
+    # the nodes are distinct cells of a grid with the two decimals written in the file,
+    # since coincident nodes would be dropped from the triangulation
+    # the coordinates are stored as (lon, lat) as in the shipped topologies
+    columns = int(round((area[1] - area[0]) * 100))
+    rows = int(round((area[3] - area[2]) * 100))
+    cells = rng.choice(columns * rows, size=num_nodes, replace=False)
+    pos = np.column_stack((area[0] + (cells % columns) / 100, area[2] + (cells // columns) / 100)).round(2)
+    # equirectangular projection, so that the geometry is not distorted by the latitude
+    xy = pos * [np.cos(np.radians(pos[:, 1].mean())), 1.]
+
+    triangles = Delaunay(xy).simplices
+    # for each edge of a triangle, the opposite node lies inside the circle having the edge as diameter
+    # if the angle at the opposite node is obtuse, i.e., the edge is not part of the Gabriel graph
+    corners = triangles[:, [0, 1, 2]]
+    opposite = triangles[:, [2, 0, 1]]
+    first = triangles[:, [1, 2, 0]]
+    obtuse = np.einsum('ijk,ijk->ij', xy[corners] - xy[opposite], xy[first] - xy[opposite]) < 0
+    delaunay_edges = np.sort(np.column_stack((corners.reshape(-1), first.reshape(-1))), axis=1)
+    lengths = reader.calculate_geographical_distances(pos[delaunay_edges[:, 0]], pos[delaunay_edges[:, 1]])
+    # an edge is shared by up to two triangles, and it is kept only if no triangle rejects it
+    keys = delaunay_edges[:, 0] * num_nodes + delaunay_edges[:, 1]
+    keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    rejected = np.zeros(len(keys), dtype=bool)
+    np.logical_or.at(rejected, inverse, obtuse.reshape(-1))
+    delaunay_edges = delaunay_edges[first_index]
+    lengths = lengths[first_index]
+
+    graph = nx.Graph()
+    graph.add_nodes_from(range(num_nodes))
+    graph.add_weighted_edges_from((int(i), int(j), float(w)) for (i, j), w in zip(delaunay_edges[~rejected], lengths[~rejected]))
+    if nx.has_bridges(graph):
+        available = {(int(i), int(j)): float(w) for (i, j), w in zip(delaunay_edges[rejected], lengths[rejected])}
+        augmentation = nx.k_edge_augmentation(graph, 2, avail=available, partial=True)
+        graph.add_weighted_edges_from((i, j, available[min(i, j), max(i, j)]) for i, j in augmentation)
+
+    # longer links are more likely to be removed, as in the Waxman model
+    length_scale = waxman_alpha * lengths.max()
+    candidates = sorted(graph.edges(data='weight'), key=lambda edge: -edge[2] * np.exp(edge[2] / length_scale) * rng.uniform(0.5, 1.))
+    num_links = graph.number_of_edges()
+    target_links = int(round(mean_degree * num_nodes / 2))
+    # first pass removes links at nodes above max_degree, second pass thins the graph towards the mean degree
+    for enforce_max in [True, False]:
+        for i, j, w in candidates:
+            if not enforce_max and num_links <= target_links:
+                break
+            if not graph.has_edge(i, j) or graph.degree(i) <= 2 or graph.degree(j) <= 2:
+                continue
+            if enforce_max and graph.degree(i) <= max_degree and graph.degree(j) <= max_degree:
+                continue
+            graph.remove_edge(i, j)
+            # the graph stays 2-edge-connected iff the removed link does not belong to a cut of two links,
+            # i.e., iff its end nodes are still connected by two link-disjoint paths
+            if not two_edge_disjoint_paths(graph, i, j):
+                graph.add_edge(i, j, weight=w)
+            else:
+                num_links -= 1
+
+    # nodes and links are numbered from 1 as in the shipped topologies
+    topology = nx.Graph(name='synthetic-{}'.format(num_nodes))
+    for node in range(num_nodes):
+        topology.add_node(str(node + 1), name='N{}'.format(node + 1), pos=(float(pos[node, 0]), float(pos[node, 1])))
+    for idx, (i, j, w) in enumerate(sorted((min(i, j), max(i, j), w) for i, j, w in graph.edges(data='weight'))):
+        topology.add_edge(str(i + 1), str(j + 1), id=idx + 1, weight=float('{:.2f}'.format(w)))
+    return topology
+
+def _augmenting_path(graph, source, target, used):
+    # breadth-first search in the residual graph of the unit-capacity flow problem,
+    # where a link can be traversed unless the flow already uses it in the same direction
+    parent = {source: None}
+    frontier = [source]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            for neighbor in graph.adj[node]:
+                if neighbor in parent or (node, neighbor) in used:
+                    continue
+                parent[neighbor] = node
+                if neighbor == target:
+                    path = [target]
+                    while parent[path[-1]] is not None:
+                        path.append(parent[path[-1]])
+                    return path[::-1]
+                next_frontier.append(neighbor)
+        frontier = next_frontier
+    return None
+
+def two_edge_disjoint_paths(graph, source, target):
+    # same as nx.edge_connectivity(graph, source, target, cutoff=2) >= 2, without building the auxiliary digraph
+    # the searches stop as soon as they reach the target, which is close to the source in geographic topologies
+    path = _augmenting_path(graph, source, target, set())
+    if path is None:
+        return False
+    used = set(zip(path[:-1], path[1:]))
+    return _augmenting_path(graph, source, target, used) is not None
+
+def degree_summary(graph):
+    degrees = np.array([d for _, d in graph.degree()])
+    return {'nodes': graph.number_of_nodes(), 'links': graph.number_of_edges(), 'min_degree': int(degrees.min()),
+            'mean_degree': float(degrees.mean()), 'max_degree': int(degrees.max()),
+            'two_edge_connected': nx.is_connected(graph) and not nx.has_bridges(graph)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generates a synthetic topology in the format read by reader.read_txt_file')
+    parser.add_argument('nodes', type=int, help='number of nodes, e.g., between 100 and 10000')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--mean-degree', type=float, default=3.2)
+    parser.add_argument('--max-degree', type=int, default=5)
+    parser.add_argument('--output', default=None, help='defaults to topologies/synthetic-<nodes>-<seed>.txt')
+    args = parser.parse_args()
+
+    topology = generate_topology(args.nodes, seed=args.seed, mean_degree=args.mean_degree, max_degree=args.max_degree)
+    output = args.output or 'topologies/synthetic-{}-{}.txt'.format(args.nodes, args.seed)
+    reader.write_txt_file(topology, output)
+    print(output, degree_summary(topology))